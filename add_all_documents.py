@@ -3,54 +3,183 @@ import hashlib
 import os
 
 from databases.chromaDB import ChromaDB
+from utils.embedding_pool import EmbeddingPool
+from utils.langchain.chunking import CHUNKING_SIGNATURE, chunk_document
+from utils.faq import FAQIndex, parse_qa
+from utils.langchain.retriver import answer_cache
 from utils.logger import Logger
 
+ADD_BATCH_SIZE = int(os.getenv("CHROMA_ADD_BATCH_SIZE", 64))
+# Files parsed into the FAQ fast-path index in addition to being embedded
+FAQ_FILES = [name.strip() for name in os.getenv("FAQ_FILES", "q_a.txt").split(",") if name.strip()]
+
+
+def _scan_files(folder_path: str) -> dict:
+    """Maps every .txt/.md file under folder_path to its current mtime."""
+    files_found = {}
+    for root, _, files in os.walk(folder_path):
+        for file in files:
+            if file.endswith((".txt", ".md")):
+                full_path = os.path.join(root, file)
+                files_found[full_path] = os.path.getmtime(full_path)
+    return files_found
+
+
+def _read_file(full_path: str) -> str:
+    with open(full_path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _is_current(stored: dict, mtime: float = None, content_hash: str = None) -> bool:
+    """True if the stored manifest entry still matches the file on disk."""
+    if not stored or stored["chunking"] != CHUNKING_SIGNATURE or stored["embedding"] != ChromaDB.EMBEDDING_SIGNATURE:
+        return False
+    if mtime is not None:
+        return stored["mtime"] == mtime
+    return stored["content_hash"] == content_hash
+
+
+async def load_manifest(collection_name: str) -> dict:
+    """
+    Rebuilds the per-file manifest (source -> content hash, mtime, chunk ids)
+    from the metadata stored next to the vectors, so it survives restarts
+    together with the collection itself.
+    """
+    stored = await ChromaDB.get_all(collection_name, include=["metadatas"])
+    manifest = {}
+    for vector_id, metadata in zip(stored.get("ids") or [], stored.get("metadatas") or []):
+        if not metadata or "source" not in metadata:
+            continue
+        entry = manifest.setdefault(metadata["source"], {
+            "content_hash": metadata.get("content_hash"),
+            "mtime": metadata.get("mtime"),
+            "chunking": metadata.get("chunking"),
+            "embedding": metadata.get("embedding"),
+            "ids": []
+        })
+        entry["ids"].append(vector_id)
+    return manifest
+
+
+async def build_faq_index(files: list[str]) -> None:
+    """Parses the Q/A files into the in-memory FAQIndex; always rebuilt since it is not persisted."""
+    faq_files = [path for path in files if os.path.basename(path) in FAQ_FILES]
+    contents = await asyncio.gather(*(asyncio.to_thread(_read_file, path) for path in faq_files))
+    await FAQIndex.build([pair for content in contents for pair in parse_qa(content)])
+
 
 async def add_profile_data_croma(folder_path: str, collection_name: str):
+    """
+    Incrementally syncs folder_path into the collection: new or changed
+    files are split into chunks and embedded, vectors of deleted files are
+    removed and unchanged files are left alone.
+
+    Returns:
+        dict: Counts of added, updated, removed and unchanged files.
+
+    Raises:
+        Exception: Whatever made the sync fail, after logging it.
+    """
     try:
-        # Load all .txt or .md files from folder
+        manifest = await load_manifest(collection_name)
+        current_files = _scan_files(folder_path)
+        summary = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+        # Drop vectors of files that no longer exist
+        removed_sources = [source for source in manifest if source not in current_files]
+        if removed_sources:
+            await ChromaDB.delete_documents(collection_name,
+                                            where_condition={"source": {"$in": removed_sources}})
+            summary["removed"] = len(removed_sources)
+
         documents = []
         metadatas = []
         ids = []
+        stale_ids = []
 
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                if file.endswith((".txt", ".md")):
-                    full_path = os.path.join(root, file)
-                    with open(full_path, "r", encoding="utf-8") as f:
-                        content = f.read().strip()
+        candidates = [full_path for full_path, mtime in current_files.items()
+                      if not _is_current(manifest.get(full_path), mtime=mtime)]
+        summary["unchanged"] += len(current_files) - len(candidates)
 
-                    if not content:
-                        continue
+        # Read the changed files concurrently
+        contents = await asyncio.gather(*(asyncio.to_thread(_read_file, path) for path in candidates))
 
-                    # Create a deterministic ID using hash (file path + content)
-                    hash_id = hashlib.md5((file + content).encode('utf-8')).hexdigest()
+        for full_path, content in zip(candidates, contents):
+            stored = manifest.get(full_path)
+            if not content:
+                if stored:
+                    stale_ids.extend(stored["ids"])
+                    summary["removed"] += 1
+                continue
 
-                    # Avoid inserting if already exists
-                    existing = await ChromaDB.get_all(collection_name, where_condition={"id": {"$eq": hash_id}})
-                    if existing and existing.get("documents"):
-                        continue  # Skip duplicate
+            # Deterministic hash of the file (file name + content)
+            content_hash = hashlib.md5((os.path.basename(full_path) + content).encode('utf-8')).hexdigest()
 
-                    documents.append(content)
-                    metadatas.append({"source": full_path})
-                    ids.append(hash_id)
+            if _is_current(stored, content_hash=content_hash):
+                # Touched but not modified
+                summary["unchanged"] += 1
+                continue
 
-        if documents:
+            if stored:
+                stale_ids.extend(stored["ids"])
+                summary["updated"] += 1
+            else:
+                summary["added"] += 1
+
+            for chunk in chunk_document(full_path, content):
+                documents.append(chunk["document"])
+                metadatas.append({**chunk["metadata"], "content_hash": content_hash,
+                                  "mtime": current_files[full_path], "chunking": CHUNKING_SIGNATURE,
+                                  "embedding": ChromaDB.EMBEDDING_SIGNATURE})
+                ids.append(chunk["id"])
+
+        if stale_ids:
+            await ChromaDB.delete_documents(collection_name, ids=stale_ids)
+
+        # Avoid inserting what already exists - one lookup for all candidates
+        existing_ids = await ChromaDB.get_existing_ids(collection_name, ids)
+        pending = [(doc, meta, doc_id) for doc, meta, doc_id in zip(documents, metadatas, ids)
+                   if doc_id not in existing_ids]
+
+        for start in range(0, len(pending), ADD_BATCH_SIZE):
+            batch = pending[start:start + ADD_BATCH_SIZE]
+            batch_documents = [doc for doc, _, _ in batch]
             await ChromaDB.add_documents(
                 collection_name=collection_name,
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
+                documents=batch_documents,
+                metadatas=[meta for _, meta, _ in batch],
+                ids=[doc_id for _, _, doc_id in batch],
+                embeddings=await EmbeddingPool.embed(batch_documents)
             )
+        await build_faq_index(list(current_files))
+
+        changed = bool(summary["added"] or summary["updated"] or summary["removed"])
+        if changed:
+            # Cached answers may quote content that just changed
+            answer_cache.clear()
+        await ChromaDB.refresh_local_index(collection_name, rebuild=changed)
+        await ChromaDB.refresh_lexical_index(collection_name)
+        Logger.info_log(f"Knowledge base synced into '{collection_name}' - {summary}")
+        return summary
     except Exception as e:
-        await Logger.error_log(__name__,'add_profile_data_croma',e)
+        Logger.error_log(__name__,'add_profile_data_croma',e)
+        # callers such as the readiness check must not treat a failed sync as done
+        raise
 
 
 async def setup_chroma():
+    Logger.start_logger()
     await ChromaDB.connect()
-    await ChromaDB.create_collection('profile')
-    await add_profile_data_croma('knowledge_base/', 'profile')
+    await EmbeddingPool.start(ChromaDB.embed)
+    collection_name = ChromaDB.collection_name('profile')
+    await ChromaDB.create_collection(collection_name)
+    await add_profile_data_croma('knowledge_base/', collection_name)
+    # the running app may still query an older collection until it restarts, so only the CLI prunes
+    pruned = await ChromaDB.prune_collections('profile')
+    if pruned:
+        Logger.info_log(f"Removed collections of previous embedding models - {pruned}")
+    await EmbeddingPool.shutdown()
 
 
 if __name__ == '__main__':
-    asyncio.run(setup_chroma())
\ No newline at end of file
+    asyncio.run(setup_chroma())
@@ -1,16 +1,22 @@
+import json
 import os
 from datetime import datetime, timezone
 
 import bson
-from fastapi import FastAPI, APIRouter, Request
+from fastapi import FastAPI, APIRouter, Depends, Request
 from dotenv import load_dotenv
-from icecream import ic
+from starlette.responses import StreamingResponse
 
 from databases.chromaDB import ChromaDB
 from databases.mongoDB import MongoMotor
 from schemas.schemas import QueryData
-from utils.langchain.retriver import gpt_response, prompt
+from utils.chat_history import CHAT_COLLECTION, MESSAGE_ID, ChatHistoryWriter
+from utils.embedding_pool import EmbeddingBatcher, query_embedding_cache
+from utils.faq import FAQIndex
+from utils.langchain.context import build_context
+from utils.langchain.retriver import FALLBACK_RESPONSE, ChatLLM, answer_cache, get_chat_llm, gpt_response, gpt_stream
 from utils.logger import Logger
+from utils.metrics import Metrics
 
 
 
@@ -20,60 +26,143 @@ load_dotenv()
 chat_router = APIRouter()
 
 
+async def retrieve(message: str) -> tuple:
+    """
+    Runs the FAQ fast path and retrieval for a query.
+
+    Returns:
+        tuple: (ready answer or None, query embedding, retrieved chunks)
+    """
+    answer = FAQIndex.exact_match(message)
+    if answer is not None:
+        Metrics.inc("portfolio_answers_total", 1, "Answers by source", source="faq")
+        return answer, None, []
+
+    query_embedding = await EmbeddingBatcher.embed_query(message)
+    answer = FAQIndex.lookup(message, query_embedding)
+    if answer is not None:
+        Metrics.inc("portfolio_answers_total", 1, "Answers by source", source="faq")
+        return answer, query_embedding, []
+
+    # retrieve the context by query
+    chunks = await ChromaDB.query_hybrid(collection_name=ChromaDB.collection_name('profile'),
+                                         query_text=message,
+                                         query_embeddings=[query_embedding],
+                                         n_results=int(os.getenv("RETRIEVE_N_DOCS")),
+                                         threshold_score=1.5)
+    cached = answer_cache.get(query_embedding, [chunk["id"] for chunk in chunks])
+    if cached is not None:
+        Metrics.inc("portfolio_answers_total", 1, "Answers by source", source="cache")
+        return cached.get('response'), query_embedding, chunks
+    Metrics.inc("portfolio_answers_total", 1, "Answers by source", source="llm")
+    return None, query_embedding, chunks
+
+
+def prompt_context(chunks: list[dict]) -> str:
+    """Token-budgeted context text for the LLM, with its size logged and recorded."""
+    context, tokens, used = build_context(chunks)
+    Metrics.observe("portfolio_context_tokens", tokens, "Prompt context tokens per LLM call")
+    Logger.info_log(f"Context: {tokens} tokens from {used}/{len(chunks)} chunks")
+    return context
+
+
+async def create_chat_indexes() -> None:
+    """Indexes backing the bucketed conversation storage; called once from lifespan."""
+    # open bucket lookup on every append
+    await MongoMotor.create_index(CHAT_COLLECTION, [("user_id", 1), ("closed", 1), ("count", 1)])
+    # reading a user's history newest bucket first
+    await MongoMotor.create_index(CHAT_COLLECTION, [("user_id", 1), ("bucket", -1)])
+    # a retried bucket append cannot store a chat pair twice
+    await MongoMotor.create_index(CHAT_COLLECTION, [(f"messages.{MESSAGE_ID}", 1)], unique=True,
+                                  partialFilterExpression={f"messages.{MESSAGE_ID}": {"$exists": True}})
+
+
+async def save_chat_pair(user_id: str, query: str, response: str) -> None:
+    chat_pair = {
+        "query": query,
+        "response": response,
+        'timestamp' : datetime.now(tz=timezone.utc)
+    }
+
+    # persisted in the background by ChatHistoryWriter, off the response path
+    await ChatHistoryWriter.enqueue(user_id, chat_pair)
+
+
 @chat_router.post('/qns-ans')
-async def chat_with_llm(query:QueryData,request:Request):
+async def chat_with_llm(query:QueryData,request:Request,llm:type[ChatLLM]=Depends(get_chat_llm)):
     try:
         data = query.model_dump()
         user_info =await request.json()
 
         # convert into embeddings
         user_id = user_info.get("userId")
-        message = data.get('query')
-        # retrieve the context by query
-        chunks = await ChromaDB.query_docs(collection_name='profile',
-                                           query_texts=[message.strip()],
-                                           n_results=int(os.getenv("RETRIEVE_N_DOCS")),
-                                           threshold_score=1.5)
-
+        message = data.get('query').strip()
 
-        response = await gpt_response(prompt=prompt,query=message.strip(),context=chunks)
+        with Metrics.timer("qns_ans"):
+            answer, query_embedding, chunks = await retrieve(message)
+            if answer is None:
+                response = await gpt_response(chain=llm.chain,query=message,
+                                              context=prompt_context(chunks))
+                answer = response.get('response')
+                if answer != FALLBACK_RESPONSE:
+                    answer_cache.set(query_embedding, [chunk["id"] for chunk in chunks], response)
 
-
-        chat_pair = {
-            "query": message.strip(),
-            "response": response.get("response"),
-            'timestamp' : datetime.now(tz=timezone.utc)
-        }
-
-        update_operation = {
-            "$setOnInsert": {
-                "user_id": user_id,
-                "created_at": datetime.utcnow()
-            },
-            "$set": {
-                "last_active": datetime.utcnow()
-            },
-            "$push": {
-                "messages": chat_pair
-            }
-        }
-
-        updated_doc = await MongoMotor.find_one_and_update_one(
-            collection_name="q_n_a",
-            find_filter={"user_id": user_id},
-            update_operation=update_operation,
-            return_doc=True,  # return updated doc if you need it
-            upsert=True
-        )
+            await save_chat_pair(user_id, message, answer)
 
         return {
-            'response' : response.get('response')
+            'response' : answer
         }
     except Exception as e:
-        await Logger.error_log(__name__,'chat_with_llm',str(e))
+        Logger.error_log(__name__,'chat_with_llm',str(e))
         return {
             'response': 'Sorry, bot is under maintenance'
         }
 
 
-
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chat_router.post('/qns-ans/stream')
+async def chat_with_llm_stream(query:QueryData,request:Request,llm:type[ChatLLM]=Depends(get_chat_llm)):
+    """Same as /qns-ans, but streams the answer as Server-Sent Events ("token" events, then "done")."""
+    data = query.model_dump()
+    user_info = await request.json()
+    user_id = user_info.get("userId")
+    message = data.get('query').strip()
+
+    async def event_stream():
+        tokens = []
+        try:
+            answer, query_embedding, chunks = await retrieve(message)
+            if answer is not None:
+                tokens.append(answer)
+                yield _sse('token', {'token': answer})
+            else:
+                async for token in gpt_stream(chain=llm.stream_chain, query=message,
+                                              context=prompt_context(chunks)):
+                    tokens.append(token)
+                    yield _sse('token', {'token': token})
+                answer_cache.set(query_embedding, [chunk["id"] for chunk in chunks], {'response': ''.join(tokens)})
+            yield _sse('done', {})
+        except Exception as e:
+            Logger.error_log(__name__,'chat_with_llm_stream',str(e))
+            yield _sse('error', {'response': 'Sorry, bot is under maintenance'})
+            return
+
+        try:
+            # persisted once the whole answer has been sent
+            await save_chat_pair(user_id, message, ''.join(tokens))
+        except Exception as e:
+            Logger.error_log(__name__,'chat_with_llm_stream',str(e))
+
+    return StreamingResponse(event_stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@chat_router.get('/cache-stats')
+async def cache_stats():
+    return {
+        'query_embeddings': query_embedding_cache.stats(),
+        'answers': answer_cache.stats()
+    }
@@ -1,28 +1,30 @@
-import os
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from datetime import datetime
 
-import aiosmtplib
 from dotenv import load_dotenv
 from fastapi import APIRouter,Request
 from fastapi.exceptions import  HTTPException
-from icecream import ic
 from starlette.responses import JSONResponse
 
 from databases.mongoDB import MongoMotor
 from schemas.schemas import ContactForm
 from utils.logger import Logger
+from utils.mailer import CONTACT_COLLECTION, EmailOutbox
 
 contact_router = APIRouter()
 
 load_dotenv()
 
+
+async def create_contact_indexes() -> None:
+    """Indexes backing the email outbox; called once from lifespan."""
+    # EmailOutbox claims the oldest due pending submission, and resets "sending" ones on start
+    await MongoMotor.create_index(CONTACT_COLLECTION, [("status", 1), ("next_attempt_at", 1)])
+
+
 @contact_router.post('/contact')
 async def contact_form(form_data:ContactForm ,request:Request):
     try:
         data = form_data.model_dump()
-        ic(data)
         name = data.get('name')
         email = data.get('email')
         message = data.get('message')
@@ -31,44 +33,19 @@ async def contact_form(form_data:ContactForm ,request:Request):
         if not data or not name or not email:
             raise HTTPException(status_code=400,detail='All fields are required')
 
-        YOUR_EMAIL = os.getenv("EMAIL")
-        APP_PASS = os.getenv("APP_PASSWORD")
-        ic(YOUR_EMAIL)
-        ic(APP_PASS)
-        msg = MIMEMultipart()
-        msg['From'] = email
-        msg['To'] = YOUR_EMAIL
-        msg['Subject'] = f"Portfolio Contact: {name}"
-
-        body = f"""
-            New message from your portfolio:
-
-            Name: {name}
-            Email: {email}
-
-            Message:
-            {message}
-            """
-
-        msg.attach(MIMEText(body, 'plain'))
-        await aiosmtplib.send(
-            msg,
-            hostname="smtp.gmail.com",
-            port=587,
-            start_tls=True,
-            username=YOUR_EMAIL,
-            password=APP_PASS
-        )
-
-
-        await MongoMotor.insert_one('contact',{
+        # stored as pending, the email itself is sent by EmailOutbox in the background
+        await MongoMotor.insert_one(CONTACT_COLLECTION,{
             'name' : name,
             'email' : email,
-            'message' : message
+            'message' : message,
+            'status' : 'pending',
+            'attempts' : 0,
+            'next_attempt_at' : datetime.utcnow()
         })
+        EmailOutbox.notify()
 
-        return {"status": "success", "message": "Message sent successfully!"}
+        return {"status": "success", "message": "Message received! I will get back to you soon."}
 
     except Exception as e:
-        await Logger.error_log(__name__,'contact_form',e)
+        Logger.error_log(__name__,'contact_form',e)
         return JSONResponse(status_code=400,content='Failed to send the message. Please be patient — we will fix it soon')
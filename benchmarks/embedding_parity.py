@@ -0,0 +1,117 @@
+"""
+Checks that an embedding backend/model retrieves the same chunks as the
+full-precision torch baseline before it is rolled out via EMBEDDING_BACKEND /
+EMBEDDING_MODEL.
+
+    python -m benchmarks.embedding_parity --backend onnx-int8
+    python -m benchmarks.embedding_parity --model sentence-transformers/all-MiniLM-L6-v2
+
+The questions of the FAQ files are used as queries against every chunk of the
+knowledge base. Exits with status 1 if the candidate is out of tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from add_all_documents import FAQ_FILES, _read_file, _scan_files
+from databases.chromaDB import EMBEDDING_BACKENDS, SentenceTransformerBackend
+from utils.faq import parse_qa
+from utils.langchain.chunking import chunk_document
+
+BASELINE_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+
+def load_corpus(folder_path: str) -> tuple[list[str], list[str]]:
+    """Returns (chunk texts, FAQ questions) of the knowledge base."""
+    chunks, questions = [], []
+    for path in sorted(_scan_files(folder_path)):
+        content = _read_file(path)
+        if not content:
+            continue
+        chunks.extend(chunk["document"] for chunk in chunk_document(path, content))
+        if os.path.basename(path) in FAQ_FILES:
+            questions.extend(question for question, _ in parse_qa(content))
+    return chunks, questions
+
+
+def embed(backend: SentenceTransformerBackend, texts: list[str]) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    matrix = np.vstack(backend(texts))
+    return matrix, time.perf_counter() - start
+
+
+def top_k(chunk_matrix: np.ndarray, query_matrix: np.ndarray, k: int, threshold: float) -> list[set]:
+    """Same selection as ChromaDB.query_chunks: k nearest by squared L2 (2 - 2cos on unit vectors), thresholded."""
+    distances = 2 - 2 * (query_matrix @ chunk_matrix.T)
+    results = []
+    for row in distances:
+        nearest = np.argsort(row)[:k]
+        results.append({int(i) for i in nearest if row[i] <= threshold})
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="onnx")
+    parser.add_argument("--model", default=BASELINE_MODEL)
+    parser.add_argument("--knowledge-base", default="knowledge_base/")
+    parser.add_argument("--k", type=int, default=int(os.getenv("RETRIEVE_N_DOCS", 5)))
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--min-overlap", type=float, default=0.8,
+                        help="minimum mean top-k overlap with the baseline")
+    parser.add_argument("--min-cosine", type=float, default=0.99,
+                        help="minimum per-vector cosine to the baseline (same model only)")
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    args = parser.parse_args()
+
+    chunks, questions = load_corpus(args.knowledge_base)
+    if not chunks or not questions:
+        print("knowledge base has no chunks or no FAQ questions", file=sys.stderr)
+        return 1
+
+    baseline = SentenceTransformerBackend(BASELINE_MODEL, "torch")
+    candidate = SentenceTransformerBackend(args.model, args.backend)
+
+    base_chunks, base_chunk_time = embed(baseline, chunks)
+    base_queries, base_query_time = embed(baseline, questions)
+    cand_chunks, cand_chunk_time = embed(candidate, chunks)
+    cand_queries, cand_query_time = embed(candidate, questions)
+
+    base_top = top_k(base_chunks, base_queries, args.k, args.threshold)
+    cand_top = top_k(cand_chunks, cand_queries, args.k, args.threshold)
+    overlaps = [len(b & c) / len(b | c) if b | c else 1.0 for b, c in zip(base_top, cand_top)]
+
+    report = {
+        "baseline": baseline.signature,
+        "candidate": candidate.signature,
+        "chunks": len(chunks),
+        "queries": len(questions),
+        "k": args.k,
+        "mean_topk_overlap": float(np.mean(overlaps)),
+        "min_topk_overlap": float(np.min(overlaps)),
+        "baseline_seconds": {"chunks": base_chunk_time, "queries": base_query_time},
+        "candidate_seconds": {"chunks": cand_chunk_time, "queries": cand_query_time},
+    }
+    passed = report["mean_topk_overlap"] >= args.min_overlap
+
+    # vectors are only comparable one to one when the model is the same
+    if args.model == BASELINE_MODEL:
+        cosines = np.sum(base_chunks * cand_chunks, axis=1)
+        report["min_cosine"] = float(np.min(cosines))
+        report["mean_cosine"] = float(np.mean(cosines))
+        passed = passed and report["min_cosine"] >= args.min_cosine
+
+    report["passed"] = passed
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Offline load test of the /qns-ans pipeline against the local stand-ins in
+benchmarks/stand_ins.py: a fake LLM with fixed latency, an in-process Chroma
+and mongomock instead of MongoDB.
+
+    pip install -r requirements-dev.txt
+    python -m benchmarks.run_benchmark --requests 500 --concurrency 20 --llm-latency 0.3
+
+Measures three stages - ingestion (add_profile_data_croma), retrieval
+(ChromaDB.query_docs) and the end-to-end endpoint - as req/s and p50/p95/p99,
+plus the per-stage breakdown recorded by Metrics, and writes everything as
+JSON (benchmarks/results/ by default) to compare runs before a deploy.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("RETRIEVE_N_DOCS", "5")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_DIR", "benchmarks/results/logs/")
+# keeps the benchmark away from the app's NumPy snapshots, which ingestion would overwrite
+os.environ.setdefault("VECTOR_INDEX_DIR", "benchmarks/results/vector_index/")
+
+import httpx
+import numpy as np
+
+from add_all_documents import add_profile_data_croma
+from api.v1.chat import create_chat_indexes
+from benchmarks.stand_ins import FakeChatLLM, HashingEmbedder, install
+from databases.chromaDB import ChromaDB
+from main import app
+from utils.chat_history import ChatHistoryWriter
+from utils.embedding_pool import EmbeddingBatcher, EmbeddingPool
+from utils.langchain.context import Tokenizer
+from utils.langchain.retriver import get_chat_llm
+from utils.logger import Logger
+from utils.metrics import Metrics
+
+COLLECTION = "profile"
+
+# Questions a recruiter would ask that are not verbatim FAQ entries
+DEFAULT_QUERIES = [
+    "What programming languages do you know?",
+    "Tell me about your work experience",
+    "Which machine learning projects have you built?",
+    "What did you do on Kaggle?",
+    "What is LeoHire?",
+    "Do you have experience with FastAPI and MongoDB?",
+    "How can I contact you?",
+    "What are your strongest skills?",
+    "Have you worked with LLMs or RAG pipelines?",
+    "Where did you study?",
+]
+
+
+def summarize(latencies: list[float], wall_time: float, errors: int = 0) -> dict:
+    values = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "wall_seconds": wall_time,
+        "requests_per_second": len(latencies) / wall_time if wall_time else 0.0,
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+async def run_load(call, total: int, concurrency: int) -> tuple[list[float], float, int]:
+    """Runs call(i) for i in range(total) with at most `concurrency` in flight."""
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception as e:
+                Logger.error_log(__name__, 'run_load', e)
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, errors
+
+
+async def bench_ingestion(folder_path: str, runs: int) -> dict:
+    """Full ingestion into an empty collection, `runs` times; the last index is kept for the other stages."""
+    latencies = []
+    collection_name = ChromaDB.collection_name(COLLECTION)
+    for _ in range(runs):
+        if collection_name in [collection.name for collection in await ChromaDB.list_collections()]:
+            await ChromaDB.delete_collection(collection_name)
+        await ChromaDB.create_collection(collection_name)
+        start = time.perf_counter()
+        await add_profile_data_croma(folder_path, collection_name)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, sum(latencies))
+
+
+async def bench_retrieval(queries: list[str], total: int, concurrency: int) -> dict:
+    n_results = int(os.getenv("RETRIEVE_N_DOCS"))
+
+    async def call(i):
+        await ChromaDB.query_docs(ChromaDB.collection_name(COLLECTION), query_texts=[queries[i % len(queries)]],
+                                  n_results=n_results, threshold_score=1.5)
+        return True
+
+    return summarize(*await run_load(call, total, concurrency))
+
+
+async def bench_end_to_end(queries: list[str], total: int, concurrency: int, users: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def call(i):
+            response = await client.post("/api/v1/qns-ans", json={
+                "query": queries[i % len(queries)],
+                "userId": f"benchmark-user-{i % users}"
+            })
+            return response.status_code == 200 and response.json().get("response") != "Sorry, bot is under maintenance"
+
+        return summarize(*await run_load(call, total, concurrency))
+
+
+async def main(args) -> dict:
+    Logger.start_logger()
+    install(HashingEmbedder() if args.embedder == "hashing" else None)
+    await EmbeddingPool.start(ChromaDB.embed)
+    await EmbeddingBatcher.start()
+    await create_chat_indexes()
+    await ChatHistoryWriter.start()
+    # loaded up front as lifespan does; if that fails (offline) the estimate is pinned for the
+    # whole run, so counts never switch to exact halfway and reports stay comparable
+    token_counts = "exact" if await Tokenizer.load() else "estimated"
+    if token_counts == "estimated":
+        Tokenizer._retry_at = math.inf
+    FakeChatLLM.configure(args.llm_latency, args.output_tokens)
+    app.dependency_overrides[get_chat_llm] = lambda: FakeChatLLM
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    report = {
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "config": vars(args),
+        "embedding": ChromaDB.EMBEDDING_SIGNATURE,
+        "token_counts": token_counts,
+        "stages": {},
+        "pipeline": {}
+    }
+    try:
+        stages = (
+            ("ingestion", lambda: bench_ingestion(args.knowledge_base, args.ingest_runs)),
+            ("retrieval", lambda: bench_retrieval(queries, args.requests, args.concurrency)),
+            ("end_to_end", lambda: bench_end_to_end(queries, args.requests, args.concurrency, args.users)),
+        )
+        for name, bench in stages:
+            Metrics.reset()
+            report["stages"][name] = await bench()
+            # per-stage breakdown (embedding, chroma_query, llm, ...) recorded during this stage
+            report["pipeline"][name] = Metrics.snapshot()
+            print(f"{name}: {json.dumps(report['stages'][name])}")
+    finally:
+        await ChatHistoryWriter.stop()
+        await EmbeddingBatcher.stop()
+        await EmbeddingPool.shutdown()
+        Logger.stop_logger()
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per retrieval / end-to-end stage")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=20, help="distinct userIds spread over the requests")
+    parser.add_argument("--ingest-runs", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--output-tokens", type=int, default=50, help="tokens per fake LLM answer")
+    parser.add_argument("--embedder", choices=("hashing", "model"), default="hashing",
+                        help="hashing needs no model download; model uses EMBEDDING_BACKEND / EMBEDDING_MODEL")
+    parser.add_argument("--knowledge-base", default="knowledge_base/")
+    parser.add_argument("--queries", help="file with one query per line instead of the built-in set")
+    parser.add_argument("--output", help="JSON report path, defaults to benchmarks/results/<timestamp>.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = asyncio.run(main(arguments))
+    output = arguments.output or os.path.join(
+        "benchmarks", "results", f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"report written to {output}")
+    sys.exit(0)
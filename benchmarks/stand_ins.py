@@ -0,0 +1,177 @@
+"""
+Local stand-ins for OpenAI, the Chroma server and MongoDB, so the /qns-ans
+pipeline can be benchmarked offline and deterministically.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+import chromadb
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import InsertOne, UpdateMany, UpdateOne
+
+from databases.chromaDB import ChromaDB
+from databases.mongoDB import MongoMotor
+from utils.langchain.retriver import prompt, stream_prompt
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model: waits `latency` seconds and answers with a fixed
+    JSON response of `output_tokens` words, reporting token usage like OpenAI.
+    """
+    latency: float = 0.5
+    output_tokens: int = 50
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _message(self, messages) -> AIMessage:
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        answer = " ".join(["token"] * self.output_tokens)
+        return AIMessage(content=json.dumps({"response": answer}), usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": input_tokens + self.output_tokens
+        })
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+
+class FakeChatLLM:
+    """Drop-in for ChatLLM, installed through app.dependency_overrides[get_chat_llm]."""
+    chain = None
+    stream_chain = None
+
+    @classmethod
+    def configure(cls, latency: float, output_tokens: int) -> None:
+        llm = FakeChatModel(latency=latency, output_tokens=output_tokens)
+        cls.chain = prompt | llm
+        cls.stream_chain = stream_prompt | llm
+
+
+class HashingEmbedder:
+    """
+    Model-free embedding: hashed bag of words, unit normalized. Keeps lexical
+    overlap meaningful for retrieval while costing microseconds per text.
+    """
+    signature = "hashing:numpy"
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: list[str]) -> list:
+        embeddings = []
+        for text in texts:
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for word in re.findall(r"\w+", text.lower()):
+                vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimensions] += 1
+            norm = np.linalg.norm(vector)
+            embeddings.append(vector / norm if norm else vector)
+        return embeddings
+
+
+class _AsyncCollection:
+    """Async facade over a collection of the in-process Chroma client."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def add(self, **kwargs):
+        return await asyncio.to_thread(self._collection.add, **kwargs)
+
+    async def query(self, **kwargs):
+        return await asyncio.to_thread(self._collection.query, **kwargs)
+
+    async def get(self, **kwargs):
+        return await asyncio.to_thread(self._collection.get, **kwargs)
+
+    async def delete(self, **kwargs):
+        return await asyncio.to_thread(self._collection.delete, **kwargs)
+
+
+class InProcessChroma:
+    """Implements the subset of AsyncHttpClient used by ChromaDB on top of an EphemeralClient."""
+
+    def __init__(self):
+        self._client = chromadb.EphemeralClient()
+
+    async def get_or_create_collection(self, name: str, **kwargs):
+        return _AsyncCollection(await asyncio.to_thread(self._client.get_or_create_collection, name=name, **kwargs))
+
+    async def get_collection(self, name: str, **kwargs):
+        return _AsyncCollection(await asyncio.to_thread(self._client.get_collection, name=name, **kwargs))
+
+    async def delete_collection(self, name: str):
+        await asyncio.to_thread(self._client.delete_collection, name=name)
+
+    async def list_collections(self):
+        return await asyncio.to_thread(self._client.list_collections)
+
+
+class _MockCollection:
+    """mongomock collection whose bulk_write applies the operations one by one."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def bulk_write(self, operations: list, ordered: bool = True):
+        # mongomock's bulk builder does not accept the options of recent pymongo operations
+        matched = modified = upserted = inserted = 0
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                await self._collection.insert_one(operation._doc)
+                inserted += 1
+                continue
+            if isinstance(operation, UpdateOne):
+                result = await self._collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, UpdateMany):
+                result = await self._collection.update_many(operation._filter, operation._doc, upsert=operation._upsert)
+            else:
+                raise TypeError(f"Unsupported bulk operation {type(operation).__name__}")
+            matched += result.matched_count
+            modified += result.modified_count
+            upserted += result.upserted_id is not None
+        return SimpleNamespace(matched_count=matched, modified_count=modified,
+                               upserted_count=upserted, inserted_count=inserted)
+
+
+class _MockDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        return _MockCollection(getattr(self._database, name))
+
+    def __getitem__(self, name):
+        return _MockCollection(self._database[name])
+
+
+def install(embedder=None) -> None:
+    """Points ChromaDB and MongoMotor at the in-process stand-ins."""
+    ChromaDB._client = InProcessChroma()
+    if embedder is not None:
+        ChromaDB._embedding_function = embedder
+        ChromaDB.EMBEDDING_SIGNATURE = embedder.signature
+    MongoMotor.client = AsyncMongoMockClient()
+    MongoMotor.db = _MockDatabase(MongoMotor.client["benchmark"])
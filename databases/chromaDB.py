@@ -1,23 +1,149 @@
+import asyncio
+import hashlib
 import os
+import threading
+
+import numpy as np
 from chromadb import AsyncHttpClient
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from chromadb.errors import NotFoundError
 from dotenv import load_dotenv
 
+from databases.numpy_index import NumpyIndex
+from utils.bm25 import BM25Index
+from utils.embedding_pool import EmbeddingPool
 from utils.logger import Logger
+from utils.metrics import Metrics
 
 load_dotenv()
 
+# "torch" (full precision), "onnx" (ONNX Runtime) or "onnx-int8" (int8-quantized ONNX export)
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# e.g. sentence-transformers/all-MiniLM-L6-v2 for a smaller, faster model
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+# quantized file shipped in the model repo; pick the one matching the CPU (avx2, avx512, arm64)
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+# "chroma" queries the server; "numpy" queries an in-process snapshot (databases/numpy_index.py)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma").lower()
+# query_hybrid fuses vector and BM25 results; "false" makes it plain vector retrieval
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+RRF_K = int(os.getenv("RRF_K", 60))
+# each arm contributes this many times n_results candidates to the fusion
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", 2))
+# fused chunks scoring below this fraction of the best one are dropped, e.g. with 0.5 a
+# chunk only one arm found is cut once another chunk ranks first in both arms
+HYBRID_MIN_SCORE_RATIO = float(os.getenv("HYBRID_MIN_SCORE_RATIO", 0.5))
+
+
+def reciprocal_rank_fusion(rankings: list[list[dict]], n_results: int, k: int = RRF_K,
+                           min_score_ratio: float = 0.0) -> list[dict]:
+    """
+    Merges ranked chunk lists by reciprocal rank fusion, sum(1 / (k + rank)),
+    keeping every field the arms set on a chunk plus the fused "score".
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            entry = fused.setdefault(chunk["id"], {"distance": None, "bm25": None, "score": 0.0})
+            entry.update(chunk)
+            entry["score"] += 1 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda chunk: chunk["score"], reverse=True)[:n_results]
+    if ranked and min_score_ratio:
+        ranked = [chunk for chunk in ranked if chunk["score"] >= ranked[0]["score"] * min_score_ratio]
+    return ranked
+
+
+class SentenceTransformerBackend:
+    """
+    Sentence-transformers model on one of EMBEDDING_BACKENDS. Returns unit
+    float32 vectors, so distances stay comparable across backends and models.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"EMBEDDING_BACKEND must be one of {EMBEDDING_BACKENDS}, got {backend!r}")
+        from sentence_transformers import SentenceTransformer
+
+        if backend == "torch":
+            model = SentenceTransformer(model_name, device="cpu")
+        else:
+            # needs optimum[onnxruntime]; the ONNX files are downloaded from the model repo
+            model_kwargs = {"file_name": EMBEDDING_ONNX_INT8_FILE} if backend == "onnx-int8" else None
+            model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        self.model_name = model_name
+        self.backend = backend
+        self._model = model
+
+    @property
+    def signature(self) -> str:
+        return f"{self.model_name}:{self.backend}"
+
+    def __call__(self, texts: list[str]) -> list:
+        embeddings = self._model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+        return [np.asarray(embedding, dtype=np.float32) for embedding in embeddings]
+
+
 class ChromaDB:
     _client = None
-    _embedding_function = SentenceTransformerEmbeddingFunction(
-        model_name="sentence-transformers/all-mpnet-base-v2"
-    )
+    # collection name -> handle, so operations skip the get_collection round trip
+    _collections = {}
+    # Keys the collection (see collection_name) and is stored with every vector
+    EMBEDDING_SIGNATURE = f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}"
+    # loaded on first use (or by load_embedding_function at startup), never at import time
+    _embedding_function = None
+    _embedding_lock = threading.Lock()
+
+    @classmethod
+    def embedding_function(cls) -> SentenceTransformerBackend:
+        """Returns the embedding model, loading the runtime and the weights on first call."""
+        if cls._embedding_function is None:
+            with cls._embedding_lock:
+                if cls._embedding_function is None:
+                    cls._embedding_function = SentenceTransformerBackend()
+                    Logger.info_log(f"Embedding model loaded - {cls.EMBEDDING_SIGNATURE}")
+        return cls._embedding_function
+
+    @classmethod
+    def embed(cls, texts: list[str]) -> list:
+        """Synchronous embedding entry point, run on the EmbeddingPool workers."""
+        return cls.embedding_function()(texts)
+
+    @classmethod
+    async def load_embedding_function(cls) -> None:
+        """Loads the model in a worker thread so startup can do other work meanwhile."""
+        await asyncio.to_thread(cls.embedding_function)
+
+    @classmethod
+    def is_model_loaded(cls) -> bool:
+        return cls._embedding_function is not None
+
+    @classmethod
+    def collection_name(cls, name: str) -> str:
+        """
+        Name of the Chroma collection holding `name` for the current embedding
+        model. A collection fixes its dimension on the first add, so vectors of
+        another model or backend never go into it: switching EMBEDDING_MODEL or
+        EMBEDDING_BACKEND syncs into a fresh collection while the old one stays
+        queryable until it is pruned.
+        """
+        return f"{name}-{hashlib.md5(cls.EMBEDDING_SIGNATURE.encode('utf-8')).hexdigest()[:8]}"
+
+    @classmethod
+    async def prune_collections(cls, name: str) -> list[str]:
+        """Deletes the collections of `name` built for other embedding models; returns their names."""
+        current = cls.collection_name(name)
+        stale = [collection.name for collection in await cls.list_collections()
+                 if collection.name != current and
+                 (collection.name == name or collection.name.startswith(f"{name}-"))]
+        for collection_name in stale:
+            await cls.delete_collection(collection_name)
+        return stale
 
     @classmethod
     async def connect(cls):
         if cls._client is None:
             cls._client = await AsyncHttpClient(host=os.getenv("CHROMA_URI"))
-            await Logger.info_log('Connection established')
+            Logger.info_log('Connection established')
 
     @classmethod
     async def close(cls):
@@ -29,53 +155,174 @@ class ChromaDB:
     @classmethod
     async def create_collection(cls, collection_name: str):
 
+        # embeddings are always computed on the EmbeddingPool and passed in explicitly
         collection = await cls._client.get_or_create_collection(
             name=collection_name,
-            embedding_function=cls._embedding_function
+            embedding_function=None
         )
-        await Logger.info_log(f"created collection - {collection_name}")
+        cls._collections[collection_name] = collection
+        Logger.info_log(f"created collection - {collection_name}")
         return collection
 
+    @classmethod
+    async def get_collection(cls, collection_name: str, refresh: bool = False):
+        """Returns the cached collection handle, fetching it from the server on first use or refresh."""
+        if refresh or collection_name not in cls._collections:
+            cls._collections[collection_name] = await cls._client.get_collection(name=collection_name)
+        return cls._collections[collection_name]
+
+    @classmethod
+    async def _run(cls, collection_name: str, operation):
+        """
+        Runs operation(collection) on the cached handle. If the server no longer
+        knows the collection (e.g. it was recreated), the handle is refreshed and
+        the operation retried once.
+        """
+        collection = await cls.get_collection(collection_name)
+        try:
+            return await operation(collection)
+        except NotFoundError:
+            cls._collections.pop(collection_name, None)
+            collection = await cls.get_collection(collection_name, refresh=True)
+            return await operation(collection)
+
     @staticmethod
-    async def add_documents(collection_name: str, documents: list[str], ids: list[str], metadatas: list[dict] = None):
-        collection = await ChromaDB._client.get_collection(name=collection_name)
-        await collection.add(
+    async def add_documents(collection_name: str, documents: list[str], ids: list[str], metadatas: list[dict] = None,
+                            embeddings: list = None):
+        await ChromaDB._run(collection_name, lambda collection: collection.add(
             documents=documents,
             ids=ids,
-            metadatas=metadatas
-        )
+            metadatas=metadatas,
+            embeddings=embeddings
+        ))
 
     @staticmethod
-    async def query_docs(collection_name: str, query_texts: list[str], n_results: int = 5,threshold_score:float=1.3) -> list:
-        collection = await ChromaDB._client.get_collection(name=collection_name)
-        results = await collection.query(
-            query_texts=query_texts,
-            n_results=n_results,
+    async def query_chunks(collection_name: str, query_texts: list[str] = None, n_results: int = 5,
+                           threshold_score: float = 1.3, query_embeddings: list = None) -> list[dict]:
+        """
+        Like query_docs, but returns every matching chunk as a dict with its
+        "id", "document", "metadata" and "distance".
 
-        )
+        Pass query_embeddings when they are already computed (e.g. by EmbeddingBatcher);
+        query_texts are otherwise embedded on the EmbeddingPool.
+        """
+        if query_embeddings is None:
+            query_embeddings = await EmbeddingPool.embed(query_texts)
+
+        # falls back to the server until the snapshot is built
+        if RETRIEVAL_BACKEND == "numpy" and NumpyIndex.has(collection_name):
+            with Metrics.timer("numpy_query"):
+                return NumpyIndex.query(collection_name, query_embeddings[0], n_results, threshold_score)
+
+        with Metrics.timer("chroma_query"):
+            results = await ChromaDB._run(collection_name, lambda collection: collection.query(
+                query_embeddings=query_embeddings, n_results=n_results))
         chunks = []
         if results.get('ids')[0]:
             for i,score in enumerate(results.get('distances')[0]):
                 if score <= threshold_score:
-                    chunks.append(results.get('documents')[0][i])
-
+                    chunks.append({
+                        "id": results.get('ids')[0][i],
+                        "document": results.get('documents')[0][i],
+                        "metadata": results.get('metadatas')[0][i],
+                        "distance": score
+                    })
 
         return chunks
 
     @staticmethod
-    async def get_all(collection_name: str,where_condition:dict):
-        collection = await ChromaDB._client.get_collection(name=collection_name)
-        return await collection.get(where= where_condition)
+    async def query_hybrid(collection_name: str, query_text: str, query_embeddings: list = None, n_results: int = 5,
+                           threshold_score: float = 1.3) -> list[dict]:
+        """
+        Vector and BM25 retrieval run concurrently and fused by reciprocal rank.
+
+        Args:
+            collection_name (str): Name of the collection.
+            query_text (str): Raw query, for the lexical arm.
+            query_embeddings (list): Precomputed query embedding, else query_text is embedded.
+            n_results (int): Number of chunks returned after fusion.
+            threshold_score (float): Distance cut-off of the vector arm.
+
+        Returns:
+            list[dict]: Chunks as in query_chunks plus "bm25" and the fused "score",
+            best first. Plain vector results when hybrid retrieval is off or the
+            lexical index is not built yet.
+        """
+        if not HYBRID_RETRIEVAL or not BM25Index.has(collection_name):
+            return await ChromaDB.query_chunks(collection_name, query_texts=[query_text], n_results=n_results,
+                                               threshold_score=threshold_score, query_embeddings=query_embeddings)
+
+        candidates = n_results * HYBRID_CANDIDATE_FACTOR
+        with Metrics.timer("hybrid_query"):
+            dense, lexical = await asyncio.gather(
+                ChromaDB.query_chunks(collection_name, query_texts=[query_text], n_results=candidates,
+                                      threshold_score=threshold_score, query_embeddings=query_embeddings),
+                asyncio.to_thread(BM25Index.query, collection_name, query_text, candidates)
+            )
+            return reciprocal_rank_fusion([dense, lexical], n_results, min_score_ratio=HYBRID_MIN_SCORE_RATIO)
+
+    @staticmethod
+    async def query_docs(collection_name: str, query_texts: list[str] = None, n_results: int = 5,threshold_score:float=1.3,
+                         query_embeddings: list = None) -> list:
+        chunks = await ChromaDB.query_chunks(collection_name, query_texts=query_texts, n_results=n_results,
+                                             threshold_score=threshold_score, query_embeddings=query_embeddings)
+        return [chunk["document"] for chunk in chunks]
+
+    @staticmethod
+    async def get_all(collection_name: str, where_condition: dict = None, include: list[str] = None):
+        if include is None:
+            return await ChromaDB._run(collection_name, lambda collection: collection.get(where=where_condition))
+        return await ChromaDB._run(collection_name, lambda collection: collection.get(where=where_condition,
+                                                                                      include=include))
+
+    @staticmethod
+    async def get_existing_ids(collection_name: str, ids: list[str]) -> set:
+        """Returns the subset of ids already stored, using a single batched lookup."""
+        if not ids:
+            return set()
+        existing = await ChromaDB._run(collection_name, lambda collection: collection.get(ids=ids, include=[]))
+        return set(existing.get("ids") or [])
+
+    @staticmethod
+    async def delete_documents(collection_name: str, ids: list[str] = None, where_condition: dict = None):
+        await ChromaDB._run(collection_name, lambda collection: collection.delete(ids=ids, where=where_condition))
+
+    @staticmethod
+    async def refresh_local_index(collection_name: str, rebuild: bool = True) -> None:
+        """
+        Keeps the NumPy snapshot of a collection in step with the server when
+        RETRIEVAL_BACKEND is "numpy". Without rebuild, the snapshot saved on disk
+        is reused if there is one.
+        """
+        if RETRIEVAL_BACKEND != "numpy":
+            return
+        if not rebuild and NumpyIndex.load(collection_name):
+            # the collection may have changed while another backend was configured
+            stored = await ChromaDB.get_all(collection_name, include=[])
+            if sorted(stored.get("ids") or []) == sorted(NumpyIndex.ids(collection_name)):
+                return
+        stored = await ChromaDB.get_all(collection_name, include=["embeddings", "documents", "metadatas"])
+        await asyncio.to_thread(NumpyIndex.save, collection_name, stored.get("ids") or [],
+                                stored.get("documents") or [], stored.get("metadatas") or [],
+                                stored.get("embeddings") if stored.get("ids") else [])
+        Logger.info_log(f"NumPy index rebuilt for '{collection_name}' - {len(stored.get('ids') or [])} vectors")
 
     @staticmethod
-    async def delete_documents(collection_name: str, ids: list[str]):
-        collection = await ChromaDB._client.get_collection(name=collection_name)
-        await collection.delete(ids=ids)
+    async def refresh_lexical_index(collection_name: str) -> None:
+        """Rebuilds the BM25 index of a collection; it lives in memory only, so this runs after every sync."""
+        if not HYBRID_RETRIEVAL:
+            return
+        stored = await ChromaDB.get_all(collection_name, include=["documents", "metadatas"])
+        await asyncio.to_thread(BM25Index.build, collection_name, stored.get("ids") or [],
+                                stored.get("documents") or [], stored.get("metadatas") or [])
 
     @staticmethod
     async def delete_collection(collection_name: str):
+        ChromaDB._collections.pop(collection_name, None)
         await ChromaDB._client.delete_collection(name=collection_name)
-        await Logger.info_log(f"Collection {collection_name} deleted successfully")
+        NumpyIndex.drop(collection_name)
+        BM25Index.drop(collection_name)
+        Logger.info_log(f"Collection {collection_name} deleted successfully")
 
     @staticmethod
     async def list_collections():
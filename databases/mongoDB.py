@@ -1,18 +1,114 @@
 import asyncio
 import os
+import time
 from datetime import datetime
-from typing import List, Union
+from typing import AsyncIterator, List, Union
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateMany, UpdateOne, monitoring
 
 from utils.logger import Logger
+from utils.metrics import Metrics
 
 
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """CMAP listener keeping connection pool counters for MongoMotor."""
+
+    def __init__(self):
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.checkout_failed = 0
+        self.pool_cleared = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "open": self.created - self.closed,
+            "in_use": self.checked_out - self.checked_in,
+            "created": self.created,
+            "closed": self.closed,
+            "checked_out": self.checked_out,
+            "checkout_failed": self.checkout_failed,
+            "pool_cleared": self.pool_cleared
+        }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pool_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failed += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_in += 1
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Times every command sent by MongoMotor into the mongo stage histograms."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        Metrics.observe("portfolio_mongo_command_seconds", event.duration_micros / 1e6,
+                        "Latency of MongoDB commands", command=event.command_name)
+
+    def failed(self, event):
+        Metrics.observe("portfolio_mongo_command_seconds", event.duration_micros / 1e6,
+                        "Latency of MongoDB commands", command=event.command_name)
+        Metrics.inc("portfolio_mongo_command_failures_total", 1, "Failed MongoDB commands",
+                    command=event.command_name)
+
 
 class MongoMotor:
     client = None
     db = None
+    pool_metrics = PoolMetricsListener()
+    # last bucket number handed out by _bucket_update
+    _last_bucket = 0
+
+    @staticmethod
+    def _client_options() -> dict:
+        """Pool, timeout and compression settings for AsyncIOMotorClient, read from the environment."""
+        options = {
+            "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 5)),
+            "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+            "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000)),
+            "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+            "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+            "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+        }
+        if os.getenv("MONGO_SOCKET_TIMEOUT_MS"):
+            options["socketTimeoutMS"] = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS"))
+        # e.g. "zstd,snappy" - needs the zstandard / python-snappy packages
+        if os.getenv("MONGO_COMPRESSORS"):
+            options["compressors"] = os.getenv("MONGO_COMPRESSORS")
+        return options
 
     @classmethod
     async def connect_to_mongo(cls) -> None:
@@ -23,11 +119,29 @@ class MongoMotor:
             RuntimeError: If unable to connect to MongoDB.
         """
         try:
-            cls.client = AsyncIOMotorClient(os.getenv('MONGO_DB_URI'))
+            cls.client = AsyncIOMotorClient(os.getenv('MONGO_DB_URI'),
+                                            event_listeners=[cls.pool_metrics, CommandMetricsListener()],
+                                            **cls._client_options())
             cls.db = cls.client[os.getenv('MONGO_DB_NAME')]
         except Exception as e:
             raise RuntimeError(f"Failed to connect to MongoDB: {str(e)}")
 
+    @classmethod
+    async def warm_up(cls) -> None:
+        """
+        Opens minPoolSize connections up front with concurrent pings, so the first
+        requests do not pay for connection setup and handshakes.
+
+        Raises:
+            RuntimeError: If MongoDB cannot be reached.
+        """
+        try:
+            connections = max(cls.client.options.pool_options.min_pool_size, 1)
+            await asyncio.gather(*(cls.client.admin.command("ping") for _ in range(connections)))
+            Logger.info_log(f"MongoDB pool warmed up - {cls.pool_metrics.snapshot()}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to warm up MongoDB connections: {str(e)}")
+
     @classmethod
     async def close_mongo_connection(cls) -> None:
         """Closes the MongoDB connection."""
@@ -121,6 +235,40 @@ class MongoMotor:
 
         return [result async for result in results]
 
+    @staticmethod
+    async def iter_many(collection_name: str, find_filter: dict = None, value_filter: dict = None,
+                        sorting_value: list = None, limit: int = None,
+                        batch_size: int = 1000) -> AsyncIterator[dict]:
+        """
+        Streams the documents matching the filter without materializing them in a list.
+
+        Args:
+            collection_name (str): The name of the MongoDB collection.
+            find_filter (dict): The filter for finding documents.
+            value_filter (dict): Projection applied on the server, so only these fields are transferred.
+            sorting_value (list): The sorting value for the results.
+            limit (int): Maximum number of documents.
+            batch_size (int): Documents fetched per server round trip.
+
+        Yields:
+            dict: One document at a time.
+        """
+        find_filter = {} if find_filter is None else find_filter
+
+        cursor = MongoMotor.db[collection_name].find(find_filter, value_filter, batch_size=batch_size)
+
+        if sorting_value is not None:
+            cursor = cursor.sort(sorting_value)
+
+        if limit is not None:
+            cursor = cursor.limit(limit)
+
+        try:
+            async for document in cursor:
+                yield document
+        finally:
+            await cursor.close()
+
     @staticmethod
     async def update_one(collection_name: str, update_filter: dict, update_value: dict | list = None,
                          remove_value: dict = None, pull_value: dict = None, upsert: bool = False,
@@ -176,7 +324,8 @@ class MongoMotor:
 
     @staticmethod
     async def find_one_and_update_one(collection_name: str, find_filter: dict, update_operation: dict,
-                                      return_doc: bool = False, upsert=True, array_filters: list = None) -> dict:
+                                      return_doc: bool = False, upsert=True, array_filters: list = None,
+                                      sort: list = None) -> dict:
 
         """
         finds and updates a single document in the specified collection based on the provided filter.
@@ -187,6 +336,7 @@ class MongoMotor:
             collection_name (str): The name of the MongoDB collection.
             find_filter (dict): The filter for identifying the document to update.
             update_operation (dict): The values to be updated.
+            sort (list): Picks which document to update when several match.
 
         Returns:
             dict: The updated document.
@@ -194,12 +344,93 @@ class MongoMotor:
         update_kwargs = {}
         if array_filters:
             update_kwargs['array_filters'] = array_filters
+        if sort:
+            update_kwargs['sort'] = sort
 
         update_operation.setdefault("$set", {})["updated_at"] = datetime.utcnow()
         return await MongoMotor.db[collection_name].find_one_and_update(find_filter, update_operation,
                                                                         upsert=upsert, return_document=return_doc,
                                                                         **update_kwargs)
 
+    @staticmethod
+    def _bucket_update(owner_filter: dict, field: str, items: list, bucket_size: int,
+                       update_value: dict = None, item_key: str = None) -> list[tuple[dict, dict]]:
+        """
+        Filters and updates appending items to the owner's open bucket. The first
+        closes the open bucket if the items do not fit in it, the second appends to
+        the open bucket or upserts a new one, so an owner never has two open buckets
+        and their items stay in order across buckets.
+
+        With item_key, neither update touches a bucket already holding one of the
+        items, so replaying the append (e.g. after a lost acknowledgement) does not
+        push them twice; a unique index on field.item_key rejects the re-upsert.
+
+        A new bucket is numbered with a value greater than any handed out before
+        (epoch milliseconds, bumped past the last one), so buckets opened within
+        one flush or millisecond still sort in the order their items were queued.
+        """
+        now = datetime.utcnow()
+        bucket = max(time.time_ns() // 1_000_000, MongoMotor._last_bucket + 1)
+        MongoMotor._last_bucket = bucket
+        room = bucket_size - len(items)
+        not_applied = {f"{field}.{item_key}": {"$nin": [item[item_key] for item in items]}} if item_key else {}
+        close_filter = {**owner_filter, "closed": {"$ne": True}, "count": {"$gt": room}, **not_applied}
+        close_update = {"$set": {"closed": True, "updated_at": now}}
+        bucket_filter = {**owner_filter, "closed": {"$ne": True}, "count": {"$lte": room}, **not_applied}
+        update = {
+            "$push": {field: {"$each": items}},
+            "$inc": {"count": len(items)},
+            "$set": {**(update_value or {}), "updated_at": now},
+            # orders the owner's buckets, see the docstring
+            "$setOnInsert": {"bucket": bucket, "created_at": now, "closed": False}
+        }
+        return [(close_filter, close_update), (bucket_filter, update)]
+
+    @staticmethod
+    def bucket_push_operations(owner_filter: dict, field: str, items: list, bucket_size: int,
+                               update_value: dict = None, item_key: str = None) -> list:
+        """
+        Builds the push_to_bucket updates as operations for an ordered bulk_write.
+
+        Args:
+            owner_filter (dict): Identifies the bucket owner (e.g. {"user_id": ...}).
+            field (str): The array field to append to.
+            items (list): Items to append, at most bucket_size of them.
+            bucket_size (int): Maximum number of items per bucket.
+            update_value (dict): Extra fields to $set on the bucket.
+            item_key (str): Unique id field of the items, makes the append safe to replay.
+
+        Returns:
+            list: UpdateMany closing a full open bucket, then the upserting UpdateOne; keep them in this order.
+        """
+        (close_filter, close_update), (bucket_filter, update) = MongoMotor._bucket_update(
+            owner_filter, field, items, bucket_size, update_value, item_key)
+        return [UpdateMany(close_filter, close_update), UpdateOne(bucket_filter, update, upsert=True)]
+
+    @staticmethod
+    async def push_to_bucket(collection_name: str, owner_filter: dict, field: str, items: list, bucket_size: int,
+                             update_value: dict = None) -> None:
+        """
+        Appends items to the owner's open bucket document, closing it and opening a
+        new bucket once it has no room left for them. The updates do not return the
+        document, so their cost stays constant however many buckets exist.
+
+        Args:
+            collection_name (str): The name of the MongoDB collection.
+            owner_filter (dict): Identifies the bucket owner (e.g. {"user_id": ...}).
+            field (str): The array field to append to (e.g. "messages").
+            items (list): Items to append, at most bucket_size of them.
+            bucket_size (int): Maximum number of items per bucket.
+            update_value (dict): Extra fields to $set on the bucket.
+
+        Returns:
+            None
+        """
+        (close_filter, close_update), (bucket_filter, update) = MongoMotor._bucket_update(
+            owner_filter, field, items, bucket_size, update_value)
+        await MongoMotor.db[collection_name].update_many(close_filter, close_update)
+        await MongoMotor.db[collection_name].update_one(bucket_filter, update, upsert=True)
+
     @staticmethod
     async def update_many(collection_name: str, update_filter: dict, update_value: dict | list) -> None:
         """
@@ -217,43 +448,68 @@ class MongoMotor:
             update_value.append({"$set": {"updated_at": datetime.utcnow()}})
 
         elif isinstance(update_value, dict):
-            update_value.update({"$set": {"updated_at": datetime.utcnow()}})
+            update_value.setdefault("$set", {})["updated_at"] = datetime.utcnow()
         await MongoMotor.db[collection_name].update_many(update_filter, update_value)
 
     @staticmethod
-    async def bulk_update(collection_name: str, update_list: List[dict]) -> None:
+    async def bulk_update(collection_name: str, update_list: List[dict], ordered: bool = False,
+                          max_batch_size: int = None) -> dict:
         """
-        updates multiple documents in the specified collection using a list of update operations.
+        updates multiple documents in the specified collection using a list of update operations,
+        sent as UpdateOne / UpdateMany operations through bulk_write in chunks.
 
         Args:
             collection_name (str): The name of the MongoDB collection.
-            update_list (List[dict]): List of dictionaries with "update_filter" and "update_value".
+            update_list (List[dict]): List of dictionaries with "update_filter" and "update_value",
+                optionally "many" (bool) to update every match and "upsert" (bool).
+            ordered (bool): Apply the operations in order and stop at the first error.
+            max_batch_size (int): Operations per bulk_write call, MONGO_BULK_MAX_BATCH_SIZE by default.
 
         Returns:
-            None
+            dict: Matched, modified and upserted counts.
         """
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("MONGO_BULK_MAX_BATCH_SIZE", 1000))
 
-        tasks = [MongoMotor.update_one(collection_name, data["update_filter"], data["update_value"]) for data in
-                 update_list]
-        await asyncio.gather(*tasks)
+        now = datetime.utcnow()
+        operations = []
+        for data in update_list:
+            operation = UpdateMany if data.get("many") else UpdateOne
+            operations.append(operation(data["update_filter"],
+                                        {"$set": {**data["update_value"], "updated_at": now}},
+                                        upsert=data.get("upsert", False)))
+
+        counts = {"matched": 0, "modified": 0, "upserted": 0}
+        for start in range(0, len(operations), max_batch_size):
+            result = await MongoMotor.bulk_write(collection_name, operations[start:start + max_batch_size],
+                                                 ordered=ordered, raise_errors=True)
+            counts["matched"] += result.matched_count
+            counts["modified"] += result.modified_count
+            counts["upserted"] += result.upserted_count
+        return counts
 
     @staticmethod
-    async def bulk_write(collection_name: str, operations: list):
+    async def bulk_write(collection_name: str, operations: list, ordered: bool = False,
+                         raise_errors: bool = False):
         """
         Perform a bulk write operation on the specified collection.
 
         :param collection_name: Name of the MongoDB collection.
         :param operations: List of bulk operations (UpdateOne, InsertOne, etc.).
+        :param ordered: Stop at the first failing operation and apply them in order.
+        :param raise_errors: Re-raise driver errors instead of returning None, e.g. to retry.
         :return: BulkWriteResult or None if operations list is empty.
         """
         if not operations:
             return None
 
         try:
-            result = await MongoMotor.db[collection_name].bulk_write(operations, ordered=False)
+            result = await MongoMotor.db[collection_name].bulk_write(operations, ordered=ordered)
             return result
         except Exception as e:
-            print(f"Bulk write error in {collection_name}: {e}")
+            if raise_errors:
+                raise
+            Logger.error_log(__name__, 'bulk_write', f"Bulk write error in {collection_name}: {e}")
             return None
 
     @staticmethod
@@ -299,6 +555,36 @@ class MongoMotor:
         aggregate_data = MongoMotor.db[collection_name].aggregate(pipeline)
         return [result async for result in aggregate_data]
 
+    @staticmethod
+    async def iter_aggregate(collection_name: str, pipeline: List[dict], batch_size: int = 1000,
+                             allow_disk_use: bool = False, projection: dict = None) -> AsyncIterator[dict]:
+        """
+        Streams the results of an aggregation without materializing them in a list.
+
+        Args:
+            collection_name (str): The name of the MongoDB collection.
+            pipeline (List[dict]): The aggregation pipeline.
+            batch_size (int): Documents fetched per server round trip.
+            allow_disk_use (bool): Let large $sort / $group stages spill to disk.
+            projection (dict): Fields to keep, pushed down right after the leading $match stages.
+
+        Yields:
+            dict: One result document at a time.
+        """
+        if projection:
+            position = 0
+            while position < len(pipeline) and "$match" in pipeline[position]:
+                position += 1
+            pipeline = pipeline[:position] + [{"$project": projection}] + pipeline[position:]
+
+        cursor = MongoMotor.db[collection_name].aggregate(pipeline, batchSize=batch_size,
+                                                          allowDiskUse=allow_disk_use)
+        try:
+            async for document in cursor:
+                yield document
+        finally:
+            await cursor.close()
+
     @staticmethod
     async def find_one_set_push(collection_name: str, update_filter: dict, update_value: dict,
                                 push_data: dict, upsert: bool = True) -> dict:
@@ -384,21 +670,21 @@ class MongoMotor:
 
             # Check if the index already exists
             existing_indexes = await collection.index_information()
-            index_name = f"{','.join(key[0] for key in keys)}_1"
+            index_name = kwargs.get('name') or '_'.join(f"{field}_{direction}" for field, direction in keys)
             if index_name in existing_indexes:
-                await Logger.info_log(
+                Logger.info_log(
                     msg=f"Index '{index_name}' already exists on collection '{collection_name}'. Skipping index creation.")
                 return index_name
 
             # Create the index with TTL if specified
-            index_options = {}
+            index_options = dict(kwargs)
             if expire_after_seconds is not None:
                 index_options['expireAfterSeconds'] = expire_after_seconds
             index_name = await collection.create_index(keys, **index_options)
-            await Logger.info_log(msg=f"Index '{index_name}' created successfully on collection '{collection_name}'.")
+            Logger.info_log(msg=f"Index '{index_name}' created successfully on collection '{collection_name}'.")
             return index_name
         except Exception as e:
-            await Logger.error_log(file_name=__name__, func_name='create_index', error=e)
+            Logger.error_log(file_name=__name__, func_name='create_index', error=e)
             raise e
 
     @staticmethod
@@ -416,6 +702,6 @@ class MongoMotor:
         try:
             collection = MongoMotor.db[collection_name]
             await collection.drop_index(index_name)
-            await Logger.info_log(msg=f"Index '{index_name}' deleted successfully from collection '{collection_name}'.")
+            Logger.info_log(msg=f"Index '{index_name}' deleted successfully from collection '{collection_name}'.")
         except Exception as e:
-            await Logger.error_log(file_name=__name__, func_name='delete_index', error=e)
+            Logger.error_log(file_name=__name__, func_name='delete_index', error=e)
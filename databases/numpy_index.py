@@ -0,0 +1,121 @@
+import json
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.logger import Logger
+
+load_dotenv()
+
+INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "vector_index/")
+
+
+class NumpyIndex:
+    """
+    In-process exact vector index: the unit embeddings of a collection as one
+    contiguous float32 matrix, memory-mapped from disk, searched with a single
+    matrix-vector product. A snapshot of the Chroma collection, rebuilt after
+    every knowledge base sync.
+    """
+    # collection name -> {"matrix", "ids", "documents", "metadatas"}
+    _indexes = {}
+
+    @staticmethod
+    def _paths(collection_name: str) -> tuple[str, str]:
+        base = os.path.join(INDEX_DIR, collection_name)
+        return f"{base}.npy", f"{base}.json"
+
+    @classmethod
+    def has(cls, collection_name: str) -> bool:
+        return collection_name in cls._indexes
+
+    @classmethod
+    def save(cls, collection_name: str, ids: list[str], documents: list[str], metadatas: list[dict],
+             embeddings) -> None:
+        """
+        Writes the collection snapshot to disk and memory-maps it.
+
+        Args:
+            collection_name (str): Name of the collection.
+            ids (list[str]): Vector ids, in the row order of embeddings.
+            documents (list[str]): Chunk texts.
+            metadatas (list[dict]): Chunk metadata.
+            embeddings: Matrix or list of vectors, normalized here.
+        """
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        matrix_path, meta_path = cls._paths(collection_name)
+
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if not len(ids):
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+
+        # written next to the live files and swapped in, so a crash never leaves half an index
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, matrix)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": list(ids), "documents": list(documents), "metadatas": list(metadatas)}, f)
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(meta_path + ".tmp", meta_path)
+        cls.load(collection_name)
+
+    @classmethod
+    def load(cls, collection_name: str) -> bool:
+        """Memory-maps a saved snapshot; False if there is none."""
+        matrix_path, meta_path = cls._paths(collection_name)
+        if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+            return False
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        cls._indexes[collection_name] = {
+            "matrix": np.load(matrix_path, mmap_mode="r"),
+            "ids": meta["ids"],
+            "documents": meta["documents"],
+            "metadatas": meta["metadatas"]
+        }
+        Logger.info_log(f"NumPy index loaded for '{collection_name}' - {len(meta['ids'])} vectors")
+        return True
+
+    @classmethod
+    def ids(cls, collection_name: str) -> list[str]:
+        return cls._indexes[collection_name]["ids"] if collection_name in cls._indexes else []
+
+    @classmethod
+    def drop(cls, collection_name: str) -> None:
+        cls._indexes.pop(collection_name, None)
+        for path in cls._paths(collection_name):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    def query(cls, collection_name: str, query_embedding, n_results: int, threshold_score: float) -> list[dict]:
+        """
+        Exact top-k by cosine similarity, returned in the shape of ChromaDB.query_chunks.
+        Distances are squared L2 between unit vectors (2 - 2cos), Chroma's default
+        space, so the same threshold_score applies to both backends.
+        """
+        index = cls._indexes[collection_name]
+        matrix = index["matrix"]
+        if not len(matrix) or n_results <= 0:
+            return []
+
+        vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return []
+        distances = 2 - 2 * (matrix @ (vector / norm))
+
+        if n_results < len(distances):
+            nearest = np.argpartition(distances, n_results)[:n_results]
+            nearest = nearest[np.argsort(distances[nearest])]
+        else:
+            nearest = np.argsort(distances)
+
+        return [{
+            "id": index["ids"][i],
+            "document": index["documents"][i],
+            "metadata": index["metadatas"][i],
+            "distance": float(distances[i])
+        } for i in nearest if distances[i] <= threshold_score]
@@ -1,37 +1,91 @@
+import asyncio
+import uuid
 from contextlib import asynccontextmanager
 
 
 # create collection first if does not exists named as 'profile'
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse
 
 from add_all_documents import add_profile_data_croma
-from api.v1.chat import chat_router
-from api.v1.contact import contact_router
+from api.v1.chat import chat_router, create_chat_indexes
+from api.v1.contact import contact_router, create_contact_indexes
 from databases.chromaDB import ChromaDB
 from databases.mongoDB import MongoMotor
-from utils.logger import Logger
+from utils.chat_history import ChatHistoryWriter
+from utils.embedding_pool import EmbeddingBatcher, EmbeddingPool
+from utils.langchain.context import Tokenizer
+from utils.langchain.retriver import ChatLLM
+from utils.logger import Logger, request_id_var
+from utils.mailer import EmailOutbox
+from utils.metrics import Metrics
+
+
+async def start_mongo():
+    await MongoMotor.connect_to_mongo()
+    await MongoMotor.warm_up()
+    await create_chat_indexes()
+    await create_contact_indexes()
+    await ChatHistoryWriter.start()
+    await EmailOutbox.start()
+
+
+async def start_chroma():
+    await ChromaDB.connect()
+    await ChromaDB.create_collection(ChromaDB.collection_name("profile"))
+
+
+async def sync_knowledge_base(app: FastAPI, chroma_ready: asyncio.Task):
+    """Loads the model and syncs the index in the background; the app is ready once this finishes."""
+    try:
+        await asyncio.gather(ChromaDB.load_embedding_function(), chroma_ready)
+        await add_profile_data_croma("knowledge_base/", ChromaDB.collection_name("profile"))
+        app.state.ready = True
+        Logger.info_log("Application ready")
+    except Exception as e:
+        # the traceback is already logged where the sync failed
+        app.state.startup_error = str(e)
+        Logger.error_log(__name__,'sync_knowledge_base',f"not ready: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    Logger.start_logger()
+    app.state.ready = False
+    app.state.startup_error = None
     try:
-        await ChromaDB.connect()
-        await MongoMotor.connect_to_mongo()
-        await ChromaDB.create_collection("profile")
-        await add_profile_data_croma("knowledge_base/", "profile")
+        await EmbeddingPool.start(ChromaDB.embed)
+        await EmbeddingBatcher.start()
+        # independent steps run concurrently; the model loads while Mongo and Chroma
+        # connect, and the index sync continues after startup
+        chroma_ready = asyncio.create_task(start_chroma())
+        sync_task = asyncio.create_task(sync_knowledge_base(app, chroma_ready))
+        try:
+            await asyncio.gather(start_mongo(), ChatLLM.start(), Tokenizer.load(), chroma_ready)
+        except Exception:
+            sync_task.cancel()
+            await asyncio.gather(sync_task, return_exceptions=True)
+            raise
 
     except Exception as e:
         raise e
 
     yield  # FastAPI app runs...
-    # On shutdown
+    # On shutdown - the collection is kept so the next start only syncs changed files
     try:
-        for collec in await ChromaDB.list_collections():
-            await ChromaDB.delete_collection(collec.name)
+        if not sync_task.done():
+            sync_task.cancel()
+            await asyncio.gather(sync_task, return_exceptions=True)
+        await ChatHistoryWriter.stop()
+        await EmailOutbox.stop()
         await MongoMotor.close_mongo_connection()
+        await ChatLLM.close()
+        await EmbeddingBatcher.stop()
+        await EmbeddingPool.shutdown()
     except Exception as e:
-        await Logger.error_log(__name__,'lifespan',e)
+        Logger.error_log(__name__,'lifespan',e)
+    Logger.stop_logger()
 
 
 
@@ -43,10 +97,51 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # correlates every log line of a request; honours an upstream X-Request-ID
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 app.include_router(chat_router,prefix='/api/v1')
 app.include_router(contact_router,prefix='/api/v1')
 
 
 @app.get("/health")
+@app.get("/health/live")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    """Liveness: the process is up and serving, regardless of startup progress."""
+    return {"status": "healthy"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: model loaded and knowledge base synced, safe to route traffic here."""
+    if app.state.ready:
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={
+        "status": "starting" if app.state.startup_error is None else "failed",
+        "model_loaded": ChromaDB.is_model_loaded(),
+        "error": app.state.startup_error
+    })
+
+
+@app.get("/metrics")
+async def metrics():
+    pool = MongoMotor.pool_metrics.snapshot()
+    gauges = {
+        "portfolio_mongo_pool_connections": ("MongoDB pool connections", {
+            (("state", "open"),): pool["open"],
+            (("state", "in_use"),): pool["in_use"]
+        })
+    }
+    return PlainTextResponse(Metrics.render(gauges), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,80 @@
+import math
+import os
+import re
+
+from dotenv import load_dotenv
+
+from utils.logger import Logger
+
+load_dotenv()
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_STOPWORDS = frozenset("""
+a an and are as at be by do does did for from has have how i in is it its me my of on or so that the their
+this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index over the chunks of a collection, the
+    lexical arm of hybrid retrieval. Rebuilt after every knowledge base sync.
+    """
+    # collection name -> {"postings", "idf", "lengths", "avg_length", "chunks"}
+    _indexes = {}
+    _k1 = float(os.getenv("BM25_K1", 1.5))
+    _b = float(os.getenv("BM25_B", 0.75))
+
+    @classmethod
+    def build(cls, collection_name: str, ids: list[str], documents: list[str], metadatas: list[dict]) -> None:
+        postings = {}
+        lengths = []
+        for position, document in enumerate(documents):
+            tokens = tokenize(document)
+            lengths.append(len(tokens))
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, frequency in frequencies.items():
+                postings.setdefault(token, []).append((position, frequency))
+
+        total = len(documents)
+        cls._indexes[collection_name] = {
+            "postings": postings,
+            "idf": {token: math.log((total - len(docs) + 0.5) / (len(docs) + 0.5) + 1)
+                    for token, docs in postings.items()},
+            "lengths": lengths,
+            "avg_length": sum(lengths) / total if total else 0.0,
+            "chunks": [{"id": chunk_id, "document": document, "metadata": metadata}
+                       for chunk_id, document, metadata in zip(ids, documents, metadatas)]
+        }
+        Logger.info_log(f"BM25 index built for '{collection_name}' - {total} chunks, {len(postings)} terms")
+
+    @classmethod
+    def has(cls, collection_name: str) -> bool:
+        return collection_name in cls._indexes
+
+    @classmethod
+    def drop(cls, collection_name: str) -> None:
+        cls._indexes.pop(collection_name, None)
+
+    @classmethod
+    def query(cls, collection_name: str, query: str, n_results: int) -> list[dict]:
+        """Top n_results chunks with a positive BM25 score, best first, each with its "bm25" score."""
+        index = cls._indexes.get(collection_name)
+        if not index or not index["avg_length"]:
+            return []
+
+        scores = {}
+        for token in set(tokenize(query)):
+            for position, frequency in index["postings"].get(token, ()):
+                norm = 1 - cls._b + cls._b * index["lengths"][position] / index["avg_length"]
+                score = index["idf"][token] * frequency * (cls._k1 + 1) / (frequency + cls._k1 * norm)
+                scores[position] = scores.get(position, 0.0) + score
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [{**index["chunks"][position], "bm25": score} for position, score in best]
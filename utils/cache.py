@@ -0,0 +1,127 @@
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation so trivially different questions share a key."""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return text.rstrip("?!. ")
+
+
+class LRUCache:
+    """
+    Size- and TTL-bounded LRU cache with hit/miss counters.
+    Meant to be used from the event loop only, so it holds no locks.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value) -> None:
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by the retrieved chunk ids and matched on query
+    similarity: a cached answer is reused when a new query retrieves the same
+    chunks and its embedding is within max_distance (cosine) of the cached one.
+    """
+
+    def __init__(self, max_distance: float = 0.05, maxsize: int = 512, ttl: float = 3600):
+        self.max_distance = max_distance
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # chunk ids -> list of (unit query embedding, answer, expires_at)
+        self._entries = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, chunk_ids: list[str]):
+        key = tuple(sorted(chunk_ids))
+        candidates = self._entries.get(key)
+        if candidates:
+            now = time.monotonic()
+            live = [entry for entry in candidates if entry[2] >= now]
+            self._size -= len(candidates) - len(live)
+            candidates[:] = live
+            if candidates:
+                query = self._unit(embedding)
+                distances = 1.0 - np.stack([entry[0] for entry in candidates]) @ query
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return candidates[best][1]
+        self.misses += 1
+        return None
+
+    def set(self, embedding, chunk_ids: list[str], answer) -> None:
+        key = tuple(sorted(chunk_ids))
+        self._entries.setdefault(key, []).append((self._unit(embedding), answer, time.monotonic() + self.ttl))
+        self._entries.move_to_end(key)
+        self._size += 1
+        # Evict whole least recently used chunk-id groups
+        while self._size > self.maxsize and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+
+from dotenv import load_dotenv
+from pymongo.errors import AutoReconnect, BulkWriteError, ConnectionFailure
+
+from databases.mongoDB import MongoMotor
+from utils.logger import Logger
+
+load_dotenv()
+
+# Conversations are stored as buckets of at most CHAT_BUCKET_SIZE messages per document
+CHAT_COLLECTION = "q_n_a"
+CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", 100))
+# Unique per chat pair (unique index in create_chat_indexes), makes bucket appends safe to retry
+MESSAGE_ID = "message_id"
+_DUPLICATE_KEY = 11000
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind queue for chat history: requests enqueue their chat pair and
+    return, a background task flushes the queue to Mongo with one bulk_write
+    per batch.
+    """
+    _queue = None
+    _task = None
+    _batch_size = 100
+    _flush_interval = 1.0
+    _max_retries = 5
+    _STOP = object()
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls._task is not None:
+            return
+        cls._batch_size = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 100))
+        cls._flush_interval = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", 1.0))
+        cls._max_retries = int(os.getenv("CHAT_WRITE_MAX_RETRIES", 5))
+        cls._queue = asyncio.Queue(maxsize=int(os.getenv("CHAT_WRITE_QUEUE_SIZE", 10000)))
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Flushes everything still queued, then stops the background task."""
+        if cls._task is None:
+            return
+        await cls._queue.put(cls._STOP)
+        await cls._task
+        cls._task = None
+
+    @classmethod
+    async def enqueue(cls, user_id: str, chat_pair: dict) -> None:
+        """Queues a chat pair for persistence; only waits when the queue is full."""
+        chat_pair.setdefault(MESSAGE_ID, uuid.uuid4().hex)
+        if cls._task is None:
+            await MongoMotor.push_to_bucket(CHAT_COLLECTION, {"user_id": user_id}, "messages", [chat_pair],
+                                            CHAT_BUCKET_SIZE, update_value={"last_active": datetime.utcnow()})
+            return
+        await cls._queue.put((user_id, chat_pair, datetime.utcnow()))
+
+    @classmethod
+    async def _run(cls) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = await asyncio.wait_for(cls._queue.get(), cls._flush_interval)
+                deadline = asyncio.get_running_loop().time() + cls._flush_interval
+                while True:
+                    if item is cls._STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= cls._batch_size:
+                        break
+                    timeout = deadline - asyncio.get_running_loop().time()
+                    if timeout <= 0:
+                        break
+                    item = await asyncio.wait_for(cls._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            if stopping:
+                # drain what is left behind the stop marker
+                while not cls._queue.empty():
+                    item = cls._queue.get_nowait()
+                    if item is not cls._STOP:
+                        batch.append(item)
+
+            for start in range(0, len(batch), cls._batch_size):
+                await cls._flush(batch[start:start + cls._batch_size])
+
+    @staticmethod
+    def _operations(batch: list) -> list:
+        """One bucket append per user and bucket-sized group, each preceded by its bucket close."""
+        per_user = {}
+        last_active = {}
+        for user_id, chat_pair, queued_at in batch:
+            per_user.setdefault(user_id, []).append(chat_pair)
+            last_active[user_id] = queued_at
+
+        operations = []
+        for user_id, messages in per_user.items():
+            for start in range(0, len(messages), CHAT_BUCKET_SIZE):
+                operations.extend(MongoMotor.bucket_push_operations(
+                    {"user_id": user_id}, "messages", messages[start:start + CHAT_BUCKET_SIZE],
+                    CHAT_BUCKET_SIZE, update_value={"last_active": last_active[user_id]}, item_key=MESSAGE_ID))
+        return operations
+
+    @classmethod
+    async def _flush(cls, batch: list) -> None:
+        if not batch:
+            return
+        operations = cls._operations(batch)
+        attempt = 0
+        while operations:
+            try:
+                # ordered: a bucket close must apply before the append that follows it
+                await MongoMotor.bulk_write(CHAT_COLLECTION, operations, ordered=True, raise_errors=True)
+                return
+            except BulkWriteError as e:
+                error = e.details["writeErrors"][0]
+                if error["code"] != _DUPLICATE_KEY:
+                    Logger.error_log(__name__, 'ChatHistoryWriter._flush', e)
+                    return
+                # the append was applied by an attempt whose acknowledgement got lost; resume after it
+                operations = operations[error["index"] + 1:]
+            except (AutoReconnect, ConnectionFailure) as e:
+                if attempt == cls._max_retries:
+                    Logger.error_log(__name__, 'ChatHistoryWriter._flush',
+                                           f"dropping {len(batch)} chat pairs after {attempt + 1} attempts: {e}")
+                    return
+                await asyncio.sleep(min(2 ** attempt * 0.5, 30))
+                attempt += 1
+            except Exception as e:
+                Logger.error_log(__name__, 'ChatHistoryWriter._flush', e)
+                return
@@ -0,0 +1,166 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from utils.cache import LRUCache, normalize_query
+from utils.logger import Logger
+from utils.metrics import Metrics
+
+load_dotenv()
+
+# normalized query text -> embedding, so repeated questions skip the model
+query_embedding_cache = LRUCache(maxsize=int(os.getenv("QUERY_EMBED_CACHE_SIZE", 1024)),
+                                 ttl=float(os.getenv("QUERY_EMBED_CACHE_TTL", 3600)))
+
+
+class EmbeddingQueueFull(RuntimeError):
+    """Raised when more embedding jobs are waiting than EMBED_QUEUE_LIMIT allows."""
+
+
+class EmbeddingPool:
+    """
+    Runs the sentence-transformers model in a dedicated thread pool so that
+    torch inference never blocks the asyncio event loop.
+    """
+    _executor = None
+    _embedding_function = None
+    _max_pending = 0
+    _pending = 0
+
+    @classmethod
+    async def start(cls, embedding_function) -> None:
+        """
+        Starts the worker pool.
+
+        Args:
+            embedding_function: Callable taking a list of texts and returning their embeddings.
+        """
+        if cls._executor is not None:
+            return
+        pool_size = int(os.getenv("EMBED_POOL_SIZE", 2))
+        queue_limit = int(os.getenv("EMBED_QUEUE_LIMIT", 32))
+        cls._embedding_function = embedding_function
+        cls._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="embedding")
+        cls._max_pending = pool_size + queue_limit
+        Logger.info_log(f"Embedding pool started - workers: {pool_size}, queue limit: {queue_limit}")
+
+    @classmethod
+    async def embed(cls, texts: list[str]) -> list:
+        """
+        Embeds texts on the worker pool.
+
+        Raises:
+            EmbeddingQueueFull: If the pool already has too many jobs waiting.
+        """
+        if cls._pending >= cls._max_pending:
+            raise EmbeddingQueueFull(f"Embedding queue is full ({cls._pending} jobs pending)")
+
+        cls._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            with Metrics.timer("embedding"):
+                return await loop.run_in_executor(cls._executor, cls._embedding_function, texts)
+        finally:
+            cls._pending -= 1
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+
+class EmbeddingBatcher:
+    """
+    Collects single query embeddings that arrive within a short window and
+    encodes them in one forward pass on the EmbeddingPool.
+    """
+    _queue = None
+    _task = None
+    _max_batch_size = 16
+    _max_wait = 0.005
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls._task is not None:
+            return
+        cls._max_batch_size = int(os.getenv("EMBED_BATCH_MAX_SIZE", 16))
+        cls._max_wait = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5)) / 1000
+        cls._queue = asyncio.Queue()
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task is None:
+            return
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+        # Nothing will serve the callers still waiting
+        while not cls._queue.empty():
+            _, future = cls._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped"))
+
+    @classmethod
+    async def embed_query(cls, text: str):
+        """
+        Returns the embedding of a single query. Served from the query cache
+        when possible, otherwise batched with concurrent callers.
+        """
+        cache_key = normalize_query(text)
+        embedding = query_embedding_cache.get(cache_key)
+        if embedding is not None:
+            return embedding
+
+        if cls._task is None:
+            embedding = (await EmbeddingPool.embed([text]))[0]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            await cls._queue.put((text, future))
+            embedding = await future
+
+        query_embedding_cache.set(cache_key, embedding)
+        return embedding
+
+    @classmethod
+    async def _collect(cls) -> list:
+        batch = [await cls._queue.get()]
+        deadline = asyncio.get_running_loop().time() + cls._max_wait
+        while len(batch) < cls._max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(cls._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @classmethod
+    async def _dispatch(cls, batch: list) -> None:
+        try:
+            embeddings = await EmbeddingPool.embed([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    @classmethod
+    async def _run(cls) -> None:
+        in_flight = set()
+        while True:
+            batch = await cls._collect()
+            # Dispatch without waiting so every pool worker can take a batch
+            task = asyncio.create_task(cls._dispatch(batch))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
@@ -0,0 +1,71 @@
+import os
+import re
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.cache import normalize_query
+from utils.embedding_pool import EmbeddingPool
+from utils.logger import Logger
+
+load_dotenv()
+
+_QA_PATTERN = re.compile(r"^Q:\s*(.+?)\s*^A:\s*(.+?)\s*(?=^Q:|\Z)", re.MULTILINE | re.DOTALL)
+
+
+def parse_qa(content: str) -> list[tuple[str, str]]:
+    """Parses "Q: ... / A: ..." pairs from a knowledge base file."""
+    return [(question.strip(), answer.strip()) for question, answer in _QA_PATTERN.findall(content)]
+
+
+class FAQIndex:
+    """
+    In-memory index over the Q/A files of the knowledge base, used to answer
+    FAQ-type questions directly without retrieval or an LLM call.
+    """
+    _answers = {}
+    _question_matrix = None
+    _matrix_answers = []
+    _min_similarity = float(os.getenv("FAQ_MIN_SIMILARITY", 0.9))
+
+    @classmethod
+    async def build(cls, pairs: list[tuple[str, str]]) -> None:
+        """
+        Rebuilds the index from (question, answer) pairs: a normalized-text
+        map for exact matches plus a matrix of unit question embeddings.
+        """
+        answers = {normalize_query(question): answer for question, answer in pairs}
+        matrix = None
+        matrix_answers = []
+        if pairs:
+            embeddings = np.asarray(await EmbeddingPool.embed([question for question, _ in pairs]), dtype=np.float32)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            matrix = embeddings / np.where(norms == 0, 1, norms)
+            matrix_answers = [answer for _, answer in pairs]
+
+        cls._answers = answers
+        cls._question_matrix = matrix
+        cls._matrix_answers = matrix_answers
+        Logger.info_log(f"FAQ index built with {len(pairs)} questions")
+
+    @classmethod
+    def exact_match(cls, query: str):
+        """Returns the answer of a question asked verbatim (after normalization), else None."""
+        return cls._answers.get(normalize_query(query))
+
+    @classmethod
+    def lookup(cls, query: str, embedding):
+        """Returns the answer of the closest FAQ question if it is similar enough, else None."""
+        answer = cls.exact_match(query)
+        if answer is not None or cls._question_matrix is None:
+            return answer
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        similarities = cls._question_matrix @ (vector / norm)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= cls._min_similarity:
+            return cls._matrix_answers[best]
+        return None
@@ -0,0 +1,59 @@
+import hashlib
+import os
+
+from dotenv import load_dotenv
+from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+
+load_dotenv()
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 50))
+# "markdown" splits .md files on headers first, "recursive" only uses the character splitter
+CHUNK_MODE = os.getenv("CHUNK_MODE", "markdown").lower()
+
+# Stored with every chunk so a change in chunking settings forces a re-sync
+CHUNKING_SIGNATURE = f"{CHUNK_MODE}:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+
+_HEADERS_TO_SPLIT_ON = [("#", "h1"), ("##", "h2"), ("###", "h3")]
+
+_text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+_markdown_splitter = MarkdownHeaderTextSplitter(_HEADERS_TO_SPLIT_ON, strip_headers=False)
+
+
+def _sections(source: str, content: str) -> list[tuple[str, str]]:
+    """Returns (heading, text) sections, header-aware for markdown files."""
+    if CHUNK_MODE == "markdown" and source.endswith(".md"):
+        sections = []
+        for doc in _markdown_splitter.split_text(content):
+            heading = " > ".join(doc.metadata[key] for _, key in _HEADERS_TO_SPLIT_ON if key in doc.metadata)
+            sections.append((heading, doc.page_content))
+        return sections
+    return [("", content)]
+
+
+def chunk_document(source: str, content: str) -> list[dict]:
+    """
+    Splits one knowledge base file into chunks.
+
+    Args:
+        source (str): Path of the file, used for metadata and ids.
+        content (str): Full text of the file.
+
+    Returns:
+        list[dict]: Chunks with a stable "id", the "document" text and its
+        "metadata" (source, heading, chunk_index).
+    """
+    chunks = []
+    for heading, text in _sections(source, content):
+        for piece in _text_splitter.split_text(text):
+            piece = piece.strip()
+            if not piece:
+                continue
+            chunk_index = len(chunks)
+            chunk_id = hashlib.md5(f"{source}:{chunk_index}:{piece}".encode("utf-8")).hexdigest()
+            chunks.append({
+                "id": chunk_id,
+                "document": piece,
+                "metadata": {"source": source, "heading": heading, "chunk_index": chunk_index}
+            })
+    return chunks
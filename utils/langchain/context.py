@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+
+from utils.logger import Logger
+
+load_dotenv()
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+# tokenizer of the chat model; tiktoken fetches it once and caches it (TIKTOKEN_CACHE_DIR)
+CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "o200k_base")
+# after a failed load, token counts are estimated and the load is retried this many seconds later
+TOKENIZER_RETRY_SECONDS = float(os.getenv("TOKENIZER_RETRY_SECONDS", 300))
+# a chunk cut to fit the budget must keep at least this many tokens, else it is skipped
+MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", 50))
+# shorter shared text between neighbouring chunks is not treated as splitter overlap
+MIN_OVERLAP_CHARS = 20
+
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+
+class Tokenizer:
+    """
+    tiktoken encoding, loaded at startup by load(); token counts fall back to
+    ~4 characters per token while it is not loaded.
+    """
+    _encoding = None
+    # monotonic time from which encoding() may schedule another load
+    _retry_at = 0.0
+    _load_task = None
+
+    @classmethod
+    async def load(cls) -> bool:
+        """Loads the encoding in a worker thread (tiktoken may download it); False if it failed."""
+        if cls._encoding is not None:
+            return True
+        try:
+            import tiktoken
+            cls._encoding = await asyncio.to_thread(tiktoken.get_encoding, CONTEXT_ENCODING)
+            Logger.info_log(f"Tokenizer loaded - {CONTEXT_ENCODING}")
+            return True
+        except Exception as e:
+            cls._retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+            Logger.error_log(__name__, 'Tokenizer.load', f"using approximate token counts: {e}")
+            return False
+
+    @classmethod
+    def encoding(cls):
+        """The loaded encoding or None; never loads on the caller, a missing one is reloaded in the background."""
+        if cls._encoding is None and time.monotonic() >= cls._retry_at:
+            cls._retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+            try:
+                cls._load_task = asyncio.get_running_loop().create_task(cls.load())
+            except RuntimeError:
+                # no event loop (scripts): estimate until load() is awaited
+                pass
+        return cls._encoding
+
+    @classmethod
+    def count(cls, text: str) -> int:
+        encoding = cls.encoding()
+        if encoding is None:
+            return (len(text) + 3) // 4
+        return len(encoding.encode(text))
+
+    @classmethod
+    def truncate(cls, text: str, max_tokens: int) -> str:
+        encoding = cls.encoding()
+        if encoding is None:
+            return text[:max_tokens * 4]
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def _rank_key(chunk: dict) -> float:
+    # fused hybrid score (higher is better), else vector distance (lower is better)
+    if chunk.get("score") is not None:
+        return -chunk["score"]
+    if chunk.get("distance") is not None:
+        return chunk["distance"]
+    return 0.0
+
+
+def _overlap(head: str, tail: str) -> int:
+    """Length of the longest suffix of head that is also a prefix of tail."""
+    for size in range(min(len(head), len(tail)), MIN_OVERLAP_CHARS - 1, -1):
+        if head.endswith(tail[:size]):
+            return size
+    return 0
+
+
+def _dedupe(chunks: list[dict]) -> list[tuple[dict, str]]:
+    """
+    Drops duplicate and contained chunks and trims the text a chunk shares with
+    a neighbour already selected from the same file (the splitter overlap).
+    """
+    selected = []
+    for chunk in chunks:
+        text = chunk["document"].strip()
+        source = (chunk.get("metadata") or {}).get("source")
+        if not text or any(text in kept for _, kept in selected):
+            continue
+        for kept_chunk, kept in selected:
+            if (kept_chunk.get("metadata") or {}).get("source") != source:
+                continue
+            text = text[_overlap(kept, text):]
+            text = text[:len(text) - _overlap(text, kept)]
+        text = text.strip()
+        if text:
+            selected.append((chunk, text))
+    return selected
+
+
+def _format(chunk: dict, text: str) -> str:
+    metadata = chunk.get("metadata") or {}
+    label = os.path.basename(metadata.get("source", ""))
+    if metadata.get("heading"):
+        label = f"{label} - {metadata['heading']}" if label else metadata["heading"]
+    return f"[{label}]\n{text}" if label else text
+
+
+def build_context(chunks: list[dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> tuple[str, int, int]:
+    """
+    Assembles the prompt context from retrieved chunks.
+
+    Args:
+        chunks (list[dict]): Chunks as returned by ChromaDB.query_chunks / query_hybrid.
+        token_budget (int): Maximum tokens of the assembled context.
+
+    Returns:
+        tuple: (context text, its token count, number of chunks used)
+    """
+    parts = []
+    used_tokens = 0
+    separator_tokens = Tokenizer.count(CHUNK_SEPARATOR)
+    for chunk, text in _dedupe(sorted(chunks, key=_rank_key)):
+        block = _format(chunk, text)
+        cost = Tokenizer.count(block) + (separator_tokens if parts else 0)
+        if used_tokens + cost <= token_budget:
+            parts.append(block)
+            used_tokens += cost
+            continue
+        # cut the first chunk that does not fit, if enough of it is left to be useful
+        remaining = token_budget - used_tokens - (separator_tokens if parts else 0)
+        if remaining >= MIN_CHUNK_TOKENS:
+            block = Tokenizer.truncate(block, remaining)
+            parts.append(block)
+            used_tokens += Tokenizer.count(block) + (separator_tokens if len(parts) > 1 else 0)
+        break
+    return CHUNK_SEPARATOR.join(parts), used_tokens, len(parts)
@@ -1,40 +1,32 @@
 import json
 import os
+import time
 from json import JSONDecodeError
 
+import httpx
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
 from icecream import ic
-from langchain.document_loaders import DirectoryLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 
+from utils.cache import SemanticCache
 from utils.logger import Logger
+from utils.metrics import Metrics
 
 
 load_dotenv()
 
-async def documents_chunking(path:str):
-# Load all .md and .txt files
-    try:
-        loader = DirectoryLoader(f"{path}/", glob="**/[!.]*" , loader_cls=TextLoader)
-        docs = loader.load()
-
-        # Split into chunks
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        chunks = splitter.split_documents(docs)
-        return chunks
-    except Exception as e:
-        await Logger.error_log(__name__,'documents_chunking',e)
-        return None
+FALLBACK_RESPONSE = 'Sorry! Can you please try again later'
 
+# Answers reused for near-identical questions over the same retrieved chunks,
+# cleared whenever the knowledge base sync changes the collection
+answer_cache = SemanticCache(max_distance=float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", 0.05)),
+                             maxsize=int(os.getenv("ANSWER_CACHE_SIZE", 512)),
+                             ttl=float(os.getenv("ANSWER_CACHE_TTL", 3600)))
 
-
-
-prompt = ChatPromptTemplate.from_messages([
-    ("system",
-     """You are Satyam Sharma an AI developer responding to recruiters on your portfolio website.
+SYSTEM_PROMPT = """You are Satyam Sharma an AI developer responding to recruiters on your portfolio website.
 
 You will be given:
 - Context: contains all the required information related to query
@@ -57,52 +49,127 @@ Response formatting rules:
    - Keep responses conversational and concise
 
 5. Only answer what is asked. Do not provide extra or unrelated information.
+"""
 
-
-Always return valid JSON: {{ "response": "<your formatted answer>" }}"""),
-    ("human",
-     """Context:
+HUMAN_PROMPT = """Context:
 {context}
 
 Query:
-{query}""")
-])
+{query}"""
 
+prompt = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT + """
 
-# Step 2: Initialize the LLM
-ic(type(prompt))
+Always return valid JSON: {{ "response": "<your formatted answer>" }}"""),
+    ("human", HUMAN_PROMPT)
+])
 
+# Plain-text variant for streaming, where tokens are forwarded as they arrive
+stream_prompt = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    ("human", HUMAN_PROMPT)
+])
 
 
-# Step 4: Call the chain in your async route or function
-async def gpt_response(prompt:ChatPromptTemplate,context: list[str], query: str):
-    try:
+class ChatLLM:
+    """
+    One ChatOpenAI client and its chains, built once in lifespan and shared by
+    every request over a pooled keep-alive HTTP client.
+    """
+    _http_client = None
+    chain = None  # prompt | llm, answers wrapped in JSON
+    stream_chain = None  # stream_prompt | llm, plain text for streaming
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls.chain is not None:
+            return
+        timeout = httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT", 30)),
+                                connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", 5)))
+        cls._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 20)),
+                max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 10)),
+                keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 60)),
+            ),
+            timeout=timeout,
+        )
         llm = ChatOpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
             model="gpt-4.1-nano",
             temperature=0.4,
             max_tokens=700,
             max_retries=2,
+            # the OpenAI client sends its own per-request timeout, which overrides the httpx default;
+            # given as httpx's (connect, read, write, pool) tuple since langchain needs it hashable
+            timeout=(timeout.connect, timeout.read, timeout.write, timeout.pool),
+            http_async_client=cls._http_client,
+            stream_usage=True,
         )
+        # No output parser: the AIMessage carries the token usage reported to /metrics
+        cls.chain = prompt | llm
+        cls.stream_chain = stream_prompt | llm
+        Logger.info_log("LLM client initialised")
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._http_client is not None:
+            await cls._http_client.aclose()
+            cls._http_client = None
+        cls.chain = None
+        cls.stream_chain = None
+
+
+def get_chat_llm() -> type[ChatLLM]:
+    """FastAPI dependency handing the shared LLM chains to the chat routes."""
+    return ChatLLM
 
-        # Optional parser if you want plain string output
-        output_parser = StrOutputParser()
-        # Step 3: Compose the chain
-        chain = prompt | llm | output_parser
 
-        result = await chain.ainvoke({"context": context, "query": query})
+def _record_usage(message: BaseMessage) -> None:
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    for token_type in ("input", "output"):
+        tokens = usage.get(f"{token_type}_tokens", 0)
+        # the summary's _sum doubles as the running token total
+        Metrics.observe("portfolio_llm_tokens", tokens, "Tokens per LLM call", type=token_type)
+
+
+async def gpt_response(chain: Runnable, context: str, query: str):
+    try:
+        with Metrics.timer("llm"):
+            message = await chain.ainvoke({"context": context, "query": query})
+        _record_usage(message)
+        result = message.content
         try:
             response = json.loads(result)
         except JSONDecodeError as je:
-            await Logger.error_log(__name__,'gpt_response',je)
-            return {'response' : 'Sorry! Can you please try again later'}
+            Logger.error_log(__name__,'gpt_response',je)
+            return {'response' : FALLBACK_RESPONSE}
         except Exception as e:
-            await Logger.error_log(__name__,'gpt_response',e)
-            return {'response' : 'Sorry! Can you please try again later'}
+            Logger.error_log(__name__,'gpt_response',e)
+            return {'response' : FALLBACK_RESPONSE}
         return response
     except Exception as e:
-        await Logger.error_log(__name__, 'calling_gpt4o_instruct', e)
+        Logger.error_log(__name__, 'calling_gpt4o_instruct', e)
         return ''
 
+
+async def gpt_stream(chain: Runnable, context: str, query: str):
+    """Yields the answer token by token; use with ChatLLM.stream_chain."""
+    start = time.perf_counter()
+    first_token = True
+    with Metrics.timer("llm_stream"):
+        async for chunk in chain.astream({"context": context, "query": query}):
+            _record_usage(chunk)
+            if not chunk.content:
+                continue
+            if first_token:
+                Metrics.observe("portfolio_stage_seconds", time.perf_counter() - start,
+                                "Latency of each request pipeline stage", stage="llm_first_token")
+                first_token = False
+            yield chunk.content
+
+
 if __name__ == '__main__':
     ic(type(prompt))
\ No newline at end of file
@@ -1,42 +1,107 @@
-import asyncio
+import json
 import logging
 import os
-from datetime import datetime
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
 from dotenv import load_dotenv
 
+# Set per request by the middleware in main.py and attached to every log line
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class _RequestIdFilter(logging.Filter):
+    """Runs in the logging thread of the caller, where the request context is visible."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Only merges the message on the caller side; tracebacks are formatted by the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for field in ("file_name", "func_name"):
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
 
 class Logger:
+    _logger = logging.getLogger("portfolio")
+    _listener = None
+
     @staticmethod
-    async def start_logger() -> None:
+    def start_logger() -> None:
+        """
+        Function to Initiate the Logger: log calls only enqueue the record, a
+        QueueListener thread formats it as JSON and writes it to stdout and to a
+        file rotated at midnight.
+        """
+        if Logger._listener is not None:
+            return
         load_dotenv()
-        log_file_path = os.getenv('LOG_DIR') + datetime.now().strftime("%d-%m-%Y") + ".log"
-        log_format = "%(asctime)s.%(msecs)03d *** %(levelname)s : %(lineno)d *** %(message)s"
-        log_date_format = "%d-%m-%Y %H:%M:%S"
+        log_dir = os.getenv('LOG_DIR', 'logs/')
+        os.makedirs(log_dir, exist_ok=True)
 
-        """ Function to Initiate the Logger """
-        if not os.path.exists(os.getenv('LOG_DIR')):
-            os.makedirs(os.getenv('LOG_DIR'), exist_ok=True)
+        formatter = JsonFormatter()
+        file_handler = TimedRotatingFileHandler(os.path.join(log_dir, "app.log"), when="midnight",
+                                                backupCount=int(os.getenv("LOG_BACKUP_DAYS", 14)),
+                                                encoding="utf-8", utc=True)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
 
-        logging.basicConfig(filename=log_file_path, format=log_format, level=logging.INFO,
-                            datefmt=log_date_format, force=True)
+        log_queue = queue.SimpleQueue()
+        queue_handler = _NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(_RequestIdFilter())
+
+        Logger._logger.handlers = [queue_handler]
+        Logger._logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        Logger._logger.propagate = False
+
+        Logger._listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        Logger._listener.start()
 
     @staticmethod
-    async def error_log(file_name: str, func_name: str, error) -> None:
-        try:
-            if not isinstance(error, str):
-                error = f"{error} | Line {error.__traceback__.tb_lineno}."
+    def stop_logger() -> None:
+        """Flushes the queued records; called on shutdown."""
+        if Logger._listener is not None:
+            Logger._listener.stop()
+            Logger._listener = None
 
-            logging.error(f"{file_name} | {func_name} | Exception : {error}")
-            print(f"{datetime.now()} | {file_name} | {func_name} | Exception : {error}")
-        except Exception as error:
-            logging.error(f"{__name__} | errorLog | Exception : {error}")
-            print(f"{datetime.now()} | {__name__} | errorLog | Exception : {error}")
+    @staticmethod
+    def error_log(file_name: str, func_name: str, error) -> None:
+        extra = {"file_name": file_name, "func_name": func_name}
+        if isinstance(error, BaseException):
+            Logger._logger.error("%s | %s | Exception : %s", file_name, func_name, error,
+                                 exc_info=(type(error), error, error.__traceback__), extra=extra)
+        else:
+            Logger._logger.error("%s | %s | Exception : %s", file_name, func_name, error, extra=extra)
 
     @staticmethod
-    async def info_log(msg: str) -> None:
-        logging.info(msg=msg)
-        print(f"{datetime.now()} | {msg}")
+    def info_log(msg: str) -> None:
+        Logger._logger.info(msg)
 
 
 if __name__ == '__main__':
-    asyncio.run(Logger.start_logger())
+    Logger.start_logger()
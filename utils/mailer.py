@@ -0,0 +1,182 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import aiosmtplib
+from dotenv import load_dotenv
+
+from databases.mongoDB import MongoMotor
+from utils.logger import Logger
+
+load_dotenv()
+
+# Contact submissions double as the durable outbox
+CONTACT_COLLECTION = "contact"
+
+
+def build_contact_email(contact: dict, recipient: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = contact['email']
+    msg['To'] = recipient
+    msg['Subject'] = f"Portfolio Contact: {contact['name']}"
+
+    body = f"""
+            New message from your portfolio:
+
+            Name: {contact['name']}
+            Email: {contact['email']}
+
+            Message:
+            {contact['message']}
+            """
+
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+class EmailOutbox:
+    """
+    Background sender for contact form emails. Pending submissions are claimed
+    from the contact collection and sent over one persistent authenticated SMTP
+    connection, rate limited, with failures retried with exponential backoff.
+    """
+    _task = None
+    _wakeup = None
+    _smtp = None
+
+    _recipient = None
+    _max_attempts = 6
+    _min_interval = 1.0
+    _poll_interval = 30.0
+    _backoff_base = 30.0
+    _backoff_max = 3600.0
+
+    @classmethod
+    async def start(cls) -> None:
+        if cls._task is not None:
+            return
+        cls._recipient = os.getenv("EMAIL")
+        cls._max_attempts = int(os.getenv("EMAIL_MAX_ATTEMPTS", 6))
+        cls._min_interval = float(os.getenv("EMAIL_MIN_INTERVAL", 1.0))
+        cls._poll_interval = float(os.getenv("EMAIL_POLL_INTERVAL", 30))
+        cls._backoff_base = float(os.getenv("EMAIL_BACKOFF_BASE", 30))
+        cls._backoff_max = float(os.getenv("EMAIL_BACKOFF_MAX", 3600))
+        cls._wakeup = asyncio.Event()
+
+        # anything claimed when the previous process stopped is sent again
+        await MongoMotor.update_many(CONTACT_COLLECTION, {"status": "sending"}, {"$set": {"status": "pending"}})
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task is not None:
+            cls._task.cancel()
+            try:
+                await cls._task
+            except asyncio.CancelledError:
+                pass
+            cls._task = None
+        await cls._disconnect()
+
+    @classmethod
+    def notify(cls) -> None:
+        """Wakes the sender after a new submission was stored."""
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+
+    @staticmethod
+    def _smtp_client() -> aiosmtplib.SMTP:
+        # SMTP_* point at Gmail by default; any local SMTP server works as a stand-in
+        return aiosmtplib.SMTP(
+            hostname=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+            port=int(os.getenv("SMTP_PORT", 587)),
+            start_tls=os.getenv("SMTP_START_TLS", "true").lower() == "true",
+            timeout=float(os.getenv("SMTP_TIMEOUT", 30)),
+        )
+
+    @classmethod
+    async def _connection(cls) -> aiosmtplib.SMTP:
+        if cls._smtp is None or not cls._smtp.is_connected:
+            cls._smtp = cls._smtp_client()
+            await cls._smtp.connect()
+            if os.getenv("APP_PASSWORD"):
+                await cls._smtp.login(os.getenv("EMAIL"), os.getenv("APP_PASSWORD"))
+        return cls._smtp
+
+    @classmethod
+    async def _disconnect(cls) -> None:
+        if cls._smtp is not None and cls._smtp.is_connected:
+            try:
+                await cls._smtp.quit()
+            except aiosmtplib.SMTPException:
+                cls._smtp.close()
+        cls._smtp = None
+
+    @classmethod
+    async def _claim(cls) -> dict:
+        """Atomically marks the oldest due submission as being sent and returns it."""
+        return await MongoMotor.find_one_and_update_one(
+            collection_name=CONTACT_COLLECTION,
+            find_filter={"status": "pending", "next_attempt_at": {"$lte": datetime.utcnow()}},
+            update_operation={"$set": {"status": "sending"}},
+            return_doc=True,
+            upsert=False,
+            sort=[("next_attempt_at", 1)]
+        )
+
+    @classmethod
+    async def _send(cls, contact: dict) -> None:
+        message = build_contact_email(contact, cls._recipient)
+        try:
+            try:
+                smtp = await cls._connection()
+                await smtp.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                # the kept-alive connection was dropped by the server, reconnect once
+                await cls._disconnect()
+                smtp = await cls._connection()
+                await smtp.send_message(message)
+        except Exception as e:
+            await cls._disconnect()
+            attempts = contact.get("attempts", 0) + 1
+            Logger.error_log(__name__, 'EmailOutbox._send', f"attempt {attempts} for {contact['_id']}: {e}")
+            delay = min(cls._backoff_base * 2 ** (attempts - 1), cls._backoff_max)
+            await MongoMotor.update_one(CONTACT_COLLECTION, {"_id": contact["_id"]}, {
+                "status": "failed" if attempts >= cls._max_attempts else "pending",
+                "attempts": attempts,
+                "last_error": str(e),
+                "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+            })
+            return
+
+        await MongoMotor.update_one(CONTACT_COLLECTION, {"_id": contact["_id"]}, {
+            "status": "sent",
+            "sent_at": datetime.utcnow()
+        })
+
+    @classmethod
+    async def _run(cls) -> None:
+        while True:
+            # cleared before claiming so a notify() during the claim is not lost
+            cls._wakeup.clear()
+            try:
+                contact = await cls._claim()
+            except Exception as e:
+                Logger.error_log(__name__, 'EmailOutbox._run', e)
+                contact = None
+
+            if contact is None:
+                # wait for a new submission or the next retry, dropping the connection if idle
+                try:
+                    await asyncio.wait_for(cls._wakeup.wait(), cls._poll_interval)
+                except asyncio.TimeoutError:
+                    await cls._disconnect()
+                continue
+
+            try:
+                await cls._send(contact)
+            except Exception as e:
+                Logger.error_log(__name__, 'EmailOutbox._run', e)
+            await asyncio.sleep(cls._min_interval)
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Count, sum and p50/p95/p99 over a sliding window of recent observations,
+    exported as a Prometheus summary. Thread safe, since pymongo monitoring
+    callbacks run on driver threads.
+    """
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.sum = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self._samples.append(value)
+
+    def quantiles(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {}
+        return {q: samples[min(int(q * len(samples)), len(samples) - 1)] for q in QUANTILES}
+
+
+class Metrics:
+    """Process-wide metric registry rendered in Prometheus text format on /metrics."""
+    _window = int(os.getenv("METRICS_WINDOW", 2048))
+    # name -> (help, {label tuple: Histogram})
+    _histograms = {}
+    # name -> (help, {label tuple: value})
+    _counters = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def observe(cls, name: str, value: float, help_text: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with cls._lock:
+            _, series = cls._histograms.setdefault(name, (help_text, {}))
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(cls._window)
+        histogram.observe(value)
+
+    @classmethod
+    def inc(cls, name: str, value: float = 1, help_text: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with cls._lock:
+            _, series = cls._counters.setdefault(name, (help_text, {}))
+            series[key] = series.get(key, 0) + value
+
+    @classmethod
+    @contextmanager
+    def timer(cls, stage: str):
+        """Times the enclosed block into portfolio_stage_seconds{stage=...}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe("portfolio_stage_seconds", time.perf_counter() - start,
+                        "Latency of each request pipeline stage", stage=stage)
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """Plain dict of every metric: summaries as count/sum/quantiles, counters as values."""
+        with cls._lock:
+            histograms = {name: dict(series) for name, (_, series) in cls._histograms.items()}
+            counters = {name: dict(series) for name, (_, series) in cls._counters.items()}
+        snapshot = {}
+        for name, series in histograms.items():
+            snapshot[name] = {",".join(f"{k}={v}" for k, v in key) or "total": {
+                "count": histogram.count,
+                "sum": histogram.sum,
+                **{f"p{int(q * 100)}": value for q, value in histogram.quantiles().items()}
+            } for key, histogram in series.items()}
+        for name, series in counters.items():
+            snapshot[name] = {",".join(f"{k}={v}" for k, v in key) or "total": value for key, value in series.items()}
+        return snapshot
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._histograms.clear()
+            cls._counters.clear()
+
+    @staticmethod
+    def _labels(key: tuple, **extra) -> str:
+        pairs = list(key) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    @classmethod
+    def render(cls, gauges: dict = None) -> str:
+        """
+        Prometheus text exposition of every metric.
+
+        Args:
+            gauges (dict): Extra point-in-time values, name -> (help, {label dict as tuple: value}).
+        """
+        lines = []
+        with cls._lock:
+            histograms = {name: (help_text, dict(series)) for name, (help_text, series) in cls._histograms.items()}
+            counters = {name: (help_text, dict(series)) for name, (help_text, series) in cls._counters.items()}
+
+        for name, (help_text, series) in sorted(histograms.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} summary")
+            for key, histogram in series.items():
+                for quantile, value in histogram.quantiles().items():
+                    lines.append(f"{name}{cls._labels(key, quantile=quantile)} {value}")
+                lines.append(f"{name}_sum{cls._labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{cls._labels(key)} {histogram.count}")
+
+        for name, (help_text, series) in sorted(counters.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{cls._labels(key)} {value}")
+
+        for name, (help_text, series) in sorted((gauges or {}).items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{cls._labels(key)} {value}")
+
+        return "\n".join(lines) + "\n"